@@ -1,20 +1,86 @@
+from google.api_core.exceptions import GoogleAPIError
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_google_genai.chat_models import ChatGoogleGenerativeAIError
 from langchain.agents import Agent
 from langchain.tools import Tool
 from langchain.agents import AgentExecutor,ZeroShotAgent
-from langchain_community.utilities import SerpAPIWrapper
 from langchain.prompts import PromptTemplate
 from langchain.agents import initialize_agent, AgentType
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from budgets import BudgetExceeded, agent_budget, guard, react_limits, take_search
+from budgets import stats as budget_stats
+from classifier import IntentClassifier, MAX_FACETS
+from cache import ResearchCache
+from facts import FactStore, fill, known_facts_prompt, unflatten
+from search import SearchClient
+from semantic import QuestionCache
+from sites import get_site_index, site_key
+from parsing import output_parser, prune
+from prompts import SplitPrompt, caching, compact, context_caches, prompt_usage
+from ratelimit import limiter, retrying
+from ratelimit import stats as rate_limit_stats
+from routing import model_usage, router
+from metrics import metrics, note, traced, tracer
 from dotenv import load_dotenv
+import streamlit as st
+import asyncio
+import contextvars
+import functools
+import threading
+import time
 import os
 import json
-import re
+import logging
 
 load_dotenv()
 google_api_key = os.getenv("GOOGLE_API_KEY")
 serp_api_key = os.getenv("SERPAPI_API_KEY")
 
+# Under `streamlit run` shared resources live in st.cache_resource; in the API,
+# CLI and benchmarks there is no Streamlit runtime, so memoize them directly.
+process_resource = st.cache_resource if st.runtime.exists() else functools.lru_cache(maxsize=None)
+
+
+# Provider failures move a call on to the tier's next model. Anything else,
+# such as the guard's BudgetExceeded, is raised as is rather than retried.
+FALLBACK_ERRORS = (GoogleAPIError, ChatGoogleGenerativeAIError, TimeoutError, ConnectionError)
+
+
+def chat_model(tier=None):
+    """The Gemini client for a model tier: traced, budgeted and sharing one rate limit.
+
+    Rate-limited calls are retried by ratelimit, behind the bucket every
+    process on the host shares, rather than by the client on its own. A
+    model that still fails, or times out, falls back to the tier's next one.
+    Each model uses its own prompt context caches (see prompts.caching).
+    """
+    tier = tier or router.default_tier
+    primary, *fallbacks = [
+        retrying(caching(ChatGoogleGenerativeAI))(
+            model=model,
+            callbacks=[tracer, guard, prompt_usage, model_usage],
+            metadata={"tier": tier, "model": model},
+            rate_limiter=limiter("gemini"),
+            max_retries=1,
+            timeout=router.timeout(tier),
+        )
+        for model in router.models(tier)
+    ]
+    if not fallbacks:
+        return primary
+    return primary.with_fallbacks(fallbacks, exceptions_to_handle=FALLBACK_ERRORS)
+
+
+def model_tier(agent):
+    """Agents are routed by class name or, for specialists, by category."""
+    return router.tier(type(agent).__name__, getattr(agent, "category", None))
+
+
+def budget_name(agent):
+    """Specialists are budgeted per category, every other agent per class."""
+    return getattr(agent, "category", type(agent).__name__)
+
 
 def simple_calculator(x: str) -> str:
     """A simple calculator that can do basic math operations."""
@@ -24,93 +90,727 @@ def simple_calculator(x: str) -> str:
     except Exception as e:
         return str(e)
     
+@process_resource
+def get_search_client():
+    return SearchClient(provider="serpapi")
+
+
 def search_google(query: str) -> str:
     """Search Google using SerpAPI."""
-    serp = SerpAPIWrapper()
-    results = serp.run(query)
-    return results
+    try:
+        # Only requests that reach SerpAPI are charged; cache hits are free.
+        return get_search_client().run(query, charge=take_search)
+    except BudgetExceeded:
+        # Tell the agent rather than raise, so it can still answer from what it has.
+        return "Search budget exhausted. Give your final answer with the information you already have."
+
+
+# Planned searches run side by side on this pool instead of one per ReAct step.
+_search_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SEARCH_WORKERS", "8")),
+    thread_name_prefix="search",
+)
+
+
+def _search_or_error(query):
+    # One failed search should not sink the others; the synthesis call sees why.
+    try:
+        return search_google(query)
+    except Exception as exc:
+        return f"Search failed: {exc}"
+
+
+def run_searches(queries):
+    """Run `queries` in parallel and return {query: result}."""
+    # Each search runs in a copy of this context so it is charged to the caller's budget.
+    futures = [_search_pool.submit(contextvars.copy_context().run, _search_or_error, q) for q in queries]
+    return dict(zip(queries, (f.result() for f in futures)))
+
+
+async def arun_searches(queries):
+    results = await asyncio.gather(*(asyncio.to_thread(_search_or_error, q) for q in queries))
+    return dict(zip(queries, results))
 
 
 calculator = Tool(
     name = "Calculator",
     func=simple_calculator,
     description="A simple calculator that can do basic math operations. Input should be a string like '2 + 2'.",
+    callbacks=[tracer],
 )
 
 web_search = Tool(
     name = "Web Search",
     func=search_google,
     description="A tool to search the web using Google. Input should be a string like 'What is the capital of France?'.",
+    callbacks=[tracer],
 )
 
 tools = [calculator, web_search]
 
 
-class CategorizerAgent:
+class AgentRegistry:
+    """Builds each agent class once per process and model tier, and hands out the shared instance."""
+
     def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+        self._agents = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, agent_cls, tier=None):
+        # The routed tier is built by a plain get; others are escalations.
+        name = f"{agent_cls.__name__}@{tier}" if tier else agent_cls.__name__
+        with self._lock:
+            agent = self._agents.get((agent_cls, tier))
+            if agent is not None:
+                self._stats[name]["hits"] += 1
+                return agent
+            start = time.perf_counter()
+            agent = agent_cls(tier=tier) if tier else agent_cls()
+            self._agents[(agent_cls, tier)] = agent
+            self._stats[name] = {
+                "build_seconds": round(time.perf_counter() - start, 4),
+                "hits": 0,
+            }
+            return agent
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._stats.items()}
+
+
+@process_resource
+def get_registry():
+    return AgentRegistry()
+
+
+def get_agent(agent_cls, tier=None):
+    """Return the process-wide instance of `agent_cls`, building it on first use.
+
+    It runs on its routed model tier unless another `tier` is given.
+    """
+    return get_registry().get(agent_cls, tier)
+
+
+def escalated(agent):
+    """`agent` on the next tier up, to retry output that failed its schema, or None."""
+    tier = router.escalation(agent.tier)
+    if tier is None:
+        return None
+    note("escalated")
+    model_usage.escalated(agent.tier)
+    return get_agent(type(agent), tier)
+
+
+# category -> (specialist class, method name); filled in by @specialist below.
+SPECIALISTS = {}
+_SPECIALIST_KEYS = {}
+FALLBACK_CATEGORY = "General Information"
+
+
+def specialist(category, method):
+    """Register the decorated agent class as the handler for `category`."""
+    def register(cls):
+        cls.category = category
+        SPECIALISTS[category] = (cls, method)
+        _SPECIALIST_KEYS[category.casefold()] = category
+        return cls
+    return register
+
+
+def resolve_category(response):
+    """Map a categorizer response onto a registered category.
+
+    Exact matches are a dict lookup. If the model returned malformed JSON or an
+    unknown label, the raw text is scanned for a category name before falling
+    back to general information, so the categorization call is never wasted.
+    """
+    category = response.get("category") or ""
+    key = _SPECIALIST_KEYS.get(category.strip().casefold())
+    if key:
+        return key
+    text = (category + " " + response.get("raw_response", "")).casefold()
+    for folded, name in _SPECIALIST_KEYS.items():
+        if folded in text:
+            return name
+    return FALLBACK_CATEGORY
+
+
+def resolve_categories(response):
+    """All registered categories a response asks about, primary category first."""
+    categories = [resolve_category(response)]
+    for label in response.get("categories") or []:
+        key = _SPECIALIST_KEYS.get(str(label).strip().casefold())
+        if key and key not in categories:
+            categories.append(key)
+    return categories[:MAX_FACETS]
+
+
+@process_resource
+def get_research_cache():
+    return ResearchCache()
+
+
+@process_resource
+def get_fact_store():
+    return FactStore()
+
+
+@process_resource
+def get_question_cache():
+    return QuestionCache(verify=model_categories)
+
+
+@process_resource
+def get_intent_classifier():
+    # Shared by the categorizer on every tier, so escalations keep one set of stats.
+    return IntentClassifier()
+
+
+def model_categories(query):
+    """(site id, categories) for `query` as the model categorizer sees it; audits question cache hits."""
+    response = get_agent(CategorizerAgent).categorize_with_model(query)
+    return response.get("site_id", ""), resolve_categories(response)
+
+
+metrics.register_collector("agent_registry", lambda: get_registry().stats())
+metrics.register_collector("research_cache", lambda: get_research_cache().stats())
+metrics.register_collector("question_cache", lambda: get_question_cache().stats())
+metrics.register_collector("fact_store", lambda: get_fact_store().stats())
+metrics.register_collector("classifier", lambda: get_intent_classifier().stats())
+metrics.register_collector("search_cache", lambda: get_search_client().stats())
+metrics.register_collector("site_index", lambda: get_site_index().stats())
+metrics.register_collector("output_parser", output_parser.stats)
+metrics.register_collector("budget_exceeded", budget_stats)
+metrics.register_collector("prompts", prompt_usage.stats)
+metrics.register_collector("rate_limits", rate_limit_stats)
+metrics.register_collector("models", model_usage.stats)
+metrics.register_collector("prompt_cache", context_caches.stats)
+
+
+# "on": expired research still inside its category's stale window (see
+# cache.STALE_WINDOWS) is answered at once and refreshed in the background.
+SERVE_STALE = os.getenv("SERVE_STALE", "on")
+
+# Background refreshes of stale research, at most one per (category, site).
+_refresh_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("REFRESH_WORKERS", "2")),
+    thread_name_prefix="refresh",
+)
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# "react": each specialist searches step by step in its own agent loop.
+# "planned": its search_tasks run side by side and one call extracts the schema.
+SPECIALIST_MODE = os.getenv("SPECIALIST_MODE", "react")
+
+
+def task_searches(agent_cls, topic, site):
+    """A specialist's search_tasks for `site`, or just the topic when no site is known."""
+    if not site_key(site):
+        return [topic]
+    return [task.format(site=site) for task in agent_cls.search_tasks]
+
+
+def research(topic, category, site=None, refresh=False):
+    """Run the specialist registered for `category` on `topic`.
+
+    Answers are cached per (category, site), so repeat questions about a
+    popular site skip the ReAct loop and its searches. Below that, known
+    facts about the site are handed to the specialist so it only searches
+    for what is missing, and skipped entirely when nothing is. `refresh`
+    skips the cache. Answers carry an "as_of" time of when they were
+    researched.
+    """
+    agent_cls, method = SPECIALISTS.get(category) or SPECIALISTS[FALLBACK_CATEGORY]
+    if SPECIALIST_MODE == "planned":
+        return planned_research(topic, category, site, task_searches(agent_cls, topic, site), refresh)
+    answer, known, missing = _recall(topic, category, site, refresh)
+    if answer is not None:
+        return answer
+    agent = get_agent(agent_cls)
+    prompt = topic + known_facts_prompt(known, missing)
+    with agent_budget(category) as budget:
+        try:
+            data = getattr(agent, method)(prompt, site)
+        except BudgetExceeded as exc:
+            return _partial(known, exc)
+        budget.audit()
+    parsed, truncated = _validated(
+        agent, agent_cls, category, data, budget.truncated, lambda agent: getattr(agent, method)(prompt, site)
+    )
+    return _checked(category, site, parsed, known, truncated)
+
+
+def _partial(known, exc):
+    """What a specialist stopped by its budget leaves: the known facts, marked incomplete.
+
+    Never cached, so the next request researches the site properly.
+    """
+    partial = prune(unflatten(known))
+    partial["incomplete"] = str(exc)
+    return json.dumps(partial, ensure_ascii=False)
+
+
+def _recall(topic, category, site, refresh=False):
+    """Return (cached answer or None, known facts, missing fields) for a research call.
+
+    A stale cached answer is returned as is while a background refresh
+    researches `topic` again.
+    """
+    cache = get_research_cache()
+    cached = None if refresh else cache.entry(category, site, allow_stale=SERVE_STALE == "on")
+    if cached is not None:
+        value, created_at, stale = cached
+        note("research_cache")
+        if stale:
+            note("stale")
+            _refresh(topic, category, site)
+        return with_as_of(value, created_at), {}, []
+    known, missing, as_of = get_fact_store().lookup(category, site)
+    if known and not missing:
+        note("fact_store")
+        answer = json.dumps(prune(unflatten(known)), ensure_ascii=False)
+        cache.put(category, site, answer, created_at=as_of)
+        return with_as_of(answer, as_of), known, missing
+    return None, known, missing
+
+
+def _refresh(topic, category, site):
+    """Research (category, site) again in the background unless that is already under way."""
+    key = (category, site_key(site))
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            research(topic, category, site, refresh=True)
+        except Exception as exc:
+            logging.getLogger("heritage.refresh").warning(
+                json.dumps({"refresh_failed": category, "site": site, "error": repr(exc)})
+            )
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    # A fresh context: the refresh is not charged to the request that found the stale answer.
+    _refresh_pool.submit(contextvars.Context().run, run)
+
+
+def with_as_of(data, researched_at):
+    """Specialist JSON `data` with an "as_of" UTC time of when it was researched."""
+    try:
+        parsed = json.loads(data)
+    except (TypeError, ValueError):
+        return data
+    if not isinstance(parsed, dict):
+        return data
+    parsed["as_of"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(researched_at))
+    return json.dumps(parsed, ensure_ascii=False)
+
+
+def _validated(agent, agent_cls, category, data, truncated, rerun):
+    """Parse `agent_cls`'s output, rerunning it a model tier up while it fails the schema.
+
+    `agent` is the one that produced `data`: the specialist, or the
+    synthesis agent in planned mode. `rerun(agent)` repeats the call on an
+    escalated instance. Returns the parse result and why the run behind it
+    was cut short by its budget, if it was (starting from `truncated`).
+    """
+    parsed = output_parser.parse(agent_cls.__name__, category, data)
+    while not parsed.ok:
+        agent = escalated(agent)
+        if agent is None:
+            break
+        try:
+            with agent_budget(category) as budget:
+                data = rerun(agent)
+                budget.audit()
+        except BudgetExceeded:
+            break
+        parsed = output_parser.parse(agent_cls.__name__, category, data)
+        truncated = budget.truncated
+    return parsed, truncated
+
+
+async def _avalidated(agent, agent_cls, category, data, truncated, rerun):
+    """Async counterpart of `_validated`; `rerun` returns an awaitable."""
+    parsed = output_parser.parse(agent_cls.__name__, category, data)
+    while not parsed.ok:
+        agent = escalated(agent)
+        if agent is None:
+            break
+        try:
+            with agent_budget(category) as budget:
+                data = await rerun(agent)
+                budget.audit()
+        except BudgetExceeded:
+            break
+        parsed = output_parser.parse(agent_cls.__name__, category, data)
+        truncated = budget.truncated
+    return parsed, truncated
+
+
+def _checked(category, site, parsed, known=None, truncated=None):
+    """Cache and learn from specialist output that passed its schema.
+
+    Output that cannot be parsed is passed on as-is for the writer but never
+    cached, so agent stop messages and broken JSON are retried next time.
+    Fields the specialist left empty are filled from the known facts. An
+    answer from a run its budget cut short (`truncated`) is marked
+    incomplete and, like a `_partial` one, neither cached nor learned from.
+    """
+    if not parsed.ok:
+        return parsed.raw
+    fill(parsed.data, known or {})
+    if truncated:
+        partial = prune(parsed.data)
+        partial["incomplete"] = truncated
+        return with_as_of(json.dumps(partial, ensure_ascii=False), time.time())
+    get_fact_store().record(category, site, parsed.data)
+    data = parsed.to_json()
+    get_research_cache().put(category, site, data)
+    return with_as_of(data, time.time())
+
+
+async def aresearch(topic, category, site=None, refresh=False):
+    """Async counterpart of `research`, awaiting the specialist's `a<method>`."""
+    agent_cls, method = SPECIALISTS.get(category) or SPECIALISTS[FALLBACK_CATEGORY]
+    if SPECIALIST_MODE == "planned":
+        return await aplanned_research(topic, category, site, task_searches(agent_cls, topic, site), refresh)
+    # The caches and fact store are SQLite: keep them off the event loop.
+    answer, known, missing = await asyncio.to_thread(_recall, topic, category, site, refresh)
+    if answer is not None:
+        return answer
+    agent = get_agent(agent_cls)
+    prompt = topic + known_facts_prompt(known, missing)
+    with agent_budget(category) as budget:
+        try:
+            data = await getattr(agent, "a" + method)(prompt, site)
+        except BudgetExceeded as exc:
+            return _partial(known, exc)
+        budget.audit()
+    parsed, truncated = await _avalidated(
+        agent, agent_cls, category, data, budget.truncated, lambda agent: getattr(agent, "a" + method)(prompt, site)
+    )
+    return await asyncio.to_thread(_checked, category, site, parsed, known, truncated)
+
+
+def planned_research(topic, category, site, queries=None, refresh=False):
+    """`research` without the ReAct loop.
+
+    Runs `queries` (the planner's, or else the specialist's search_tasks)
+    side by side and fills the specialist's schema with a single synthesis
+    call, so latency is one search round plus one model call.
+    """
+    agent_cls, _ = SPECIALISTS.get(category) or SPECIALISTS[FALLBACK_CATEGORY]
+    answer, known, missing = _recall(topic, category, site, refresh)
+    if answer is not None:
+        return answer
+    synthesis = get_agent(SynthesisAgent)
+    prompt = topic + known_facts_prompt(known, missing)
+    with agent_budget(category) as budget:
+        try:
+            results = run_searches(queries or task_searches(agent_cls, topic, site))
+            data = synthesis.synthesize(category, prompt, results, site)
+        except BudgetExceeded as exc:
+            return _partial(known, exc)
+        budget.audit()
+    parsed, truncated = _validated(
+        synthesis, agent_cls, category, data, budget.truncated,
+        lambda agent: agent.synthesize(category, prompt, results, site),
+    )
+    return _checked(category, site, parsed, known, truncated)
+
+
+async def aplanned_research(topic, category, site, queries=None, refresh=False):
+    """Async counterpart of `planned_research`."""
+    agent_cls, _ = SPECIALISTS.get(category) or SPECIALISTS[FALLBACK_CATEGORY]
+    answer, known, missing = await asyncio.to_thread(_recall, topic, category, site, refresh)
+    if answer is not None:
+        return answer
+    synthesis = get_agent(SynthesisAgent)
+    prompt = topic + known_facts_prompt(known, missing)
+    with agent_budget(category) as budget:
+        try:
+            results = await arun_searches(queries or task_searches(agent_cls, topic, site))
+            data = await synthesis.asynthesize(category, prompt, results, site)
+        except BudgetExceeded as exc:
+            return _partial(known, exc)
+        budget.audit()
+    parsed, truncated = await _avalidated(
+        synthesis, agent_cls, category, data, budget.truncated,
+        lambda agent: agent.asynthesize(category, prompt, results, site),
+    )
+    return await asyncio.to_thread(_checked, category, site, parsed, known, truncated)
+
+
+def planned_searches(plan, category, limit=None):
+    """The search queries a planner response assigned to `category`."""
+    limit = limit or int(os.getenv("PLAN_MAX_SEARCHES", "4"))
+    queries = [
+        item["query"] for item in plan.get("searches") or []
+        if item.get("query") and _SPECIALIST_KEYS.get(str(item.get("category")).strip().casefold()) == category
+    ]
+    return queries[:limit]
+
+
+class CategorizerAgent:
+    def __init__(self, tier=None):
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
         self.tools = tools
         self.agent = initialize_agent(
             tools=self.tools,
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-            verbose=True,
-            handle_parsing_errors=True
+            verbose=False,
+            handle_parsing_errors=True,
+            **react_limits(budget_name(self))
         )
+        self.classifier = get_intent_classifier()
     
-    def categorize_topic(self, topic):
-        prompt = f"""
+    prompt = SplitPrompt(
+        "CategorizerAgent",
+        static="""
         You are a Categorizer AI Agent that receives natural language queries from users about heritage or historical sites.
 
         Your task is to extract structured metadata from the query and return a **strictly valid JSON object** in the following format:
 
-        {{
+        {
         "category": "<One of: General Information, Location & Accessibility, Visiting Hours & Timing, Tickets & Pricing, Historical & Cultural Insights, Visitor Tips & Rules, Facilities & Nearby Attractions, Custom Experience, Comparison & Recommendations, Language & Culture>",
         "site": "<The name of the heritage site mentioned, if any. If none specified, write 'Unknown'>",
         "intent": "<A short natural language phrase explaining what the user wants to know or achieve>",
+        "categories": ["<Every category from the same list that the query asks about, most important first>"],
         "question_type": "<One of: fact, opinion, recommendation, instruction, comparison, clarification>"
-        }}
+        }
 
         Instructions:
-        - Use only one category per query.
+        - Use one category per query unless it clearly asks about several aspects (e.g. opening hours and ticket prices). Then list each of them in "categories" and put the main one in "category".
         - Focus only on heritage/tourist/historical-related topics.
         - Keep your output strictly in raw JSON (no markdown, no code block).
         - Do not explain or narrate anything outside the JSON object.
         - If the site is not mentioned, set "site" as "Unknown".
-
+        """,
+        variable="""
         Now, categorize the following user query:
         "{topic}"
-        """
-        response = self.llm.invoke(prompt).content.strip()
-        
-        # Clean markdown-style formatting (if any)
-        response = re.sub(r"^```json|```$", "", response).strip()
+        """,
+    )
+
+    def build_prompt(self, topic):
+        return self.prompt.render(topic=topic)
 
+    def parse(self, response):
+        result = output_parser.parse("CategorizerAgent", "Categorizer", response)
+        if not result.ok:
+            return {"error": result.error, "raw_response": response, "site_id": ""}
+        return self.with_site_id(result.data)
+
+    def with_site_id(self, result):
+        # The stable key every later stage caches and deduplicates on.
+        result["site_id"] = site_key(result.get("site"))
+        return result
+
+    def best_guess(self, topic):
+        """The local classifier's answer however unsure it is, for when the model is out of budget."""
+        result, _ = self.classifier.predict(topic)
+        return self.with_site_id(result)
+
+    @traced("categorize")
+    def categorize_topic(self, topic):
+        # Confident local predictions skip the Gemini round-trip entirely.
+        fast = self.classifier.classify(topic)
+        if fast is not None:
+            return self.with_site_id(fast)
+        return self.categorize_with_model(topic)
+
+    def categorize_with_model(self, topic):
+        try:
+            with agent_budget("CategorizerAgent"):
+                messages, options = self.prompt.inputs(topic=topic)
+                result = self.parse(self.llm.invoke(messages, **options).content)
+        except BudgetExceeded:
+            return self.best_guess(topic)
+        # An answer that fails the schema is asked again a model tier up.
+        stronger = escalated(self) if "error" in result else None
+        return stronger.categorize_with_model(topic) if stronger else result
+
+    @traced("categorize")
+    async def acategorize_topic(self, topic):
+        fast = self.classifier.classify(topic)
+        if fast is not None:
+            return self.with_site_id(fast)
+        return await self.acategorize_with_model(topic)
+
+    async def acategorize_with_model(self, topic):
+        try:
+            with agent_budget("CategorizerAgent"):
+                messages, options = self.prompt.inputs(topic=topic)
+                response = await self.llm.ainvoke(messages, **options)
+        except BudgetExceeded:
+            return self.best_guess(topic)
+        result = self.parse(response.content)
+        stronger = escalated(self) if "error" in result else None
+        return await stronger.acategorize_with_model(topic) if stronger else result
+
+
+class PlannerAgent:
+    """Categorizes a query and plans its web searches in one model call.
+
+    Used by PIPELINE_MODE=fused in place of the categorizer, so the
+    specialists can skip their ReAct loops and search straight away.
+    """
+
+    def __init__(self, tier=None):
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
+
+    prompt = SplitPrompt(
+        "PlannerAgent",
+        static="""
+        You are a Research Planner Agent that receives natural language queries from users about heritage or historical sites.
+
+        Your task is to categorize the query and plan the web searches needed to answer it, returning a **strictly valid JSON object** in the following format:
+
+        {
+        "category": "<One of: General Information, Location & Accessibility, Visiting Hours & Timing, Tickets & Pricing, Historical & Cultural Insights, Visitor Tips & Rules, Facilities & Nearby Attractions, Custom Experience, Comparison & Recommendations, Language & Culture>",
+        "site": "<The name of the heritage site mentioned, if any. If none specified, write 'Unknown'>",
+        "intent": "<A short natural language phrase explaining what the user wants to know or achieve>",
+        "categories": ["<Every category from the same list that the query asks about, most important first>"],
+        "question_type": "<One of: fact, opinion, recommendation, instruction, comparison, clarification>",
+        "searches": [
+            {"category": "<One of the categories above>", "query": "<A Google search query>"}
+        ]
+        }
+
+        Instructions:
+        - Use one category per query unless it clearly asks about several aspects (e.g. opening hours and ticket prices). Then list each of them in "categories" and put the main one in "category".
+        - For each category in "categories", write 2 to 4 short, specific search queries that would find official or authoritative facts for it (e.g. "Taj Mahal opening hours official site").
+        - Always include the full site name in every search query.
+        - Focus only on heritage/tourist/historical-related topics.
+        - Keep your output strictly in raw JSON (no markdown, no code block).
+        - Do not explain or narrate anything outside the JSON object.
+        - If the site is not mentioned, set "site" as "Unknown".
+        """,
+        variable="""
+        Now, plan the following user query:
+        "{topic}"
+        """,
+    )
+
+    def build_prompt(self, topic):
+        return self.prompt.render(topic=topic)
+
+    def parse(self, response):
+        result = output_parser.parse("PlannerAgent", "Planner", response)
+        if not result.ok:
+            return {"error": result.error, "raw_response": response, "site_id": "", "searches": []}
+        plan = result.data
+        plan["site_id"] = site_key(plan.get("site"))
+        return plan
+
+    def best_guess(self, topic):
+        # No plan within budget: categorize locally and let each facet use its task searches.
+        return dict(get_agent(CategorizerAgent).best_guess(topic), searches=[])
+
+    @traced("plan")
+    def plan(self, topic):
         try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            return {"error": "Invalid JSON format returned", "raw_response": response}
-        
+            with agent_budget("PlannerAgent"):
+                messages, options = self.prompt.inputs(topic=topic)
+                plan = self.parse(self.llm.invoke(messages, **options).content)
+        except BudgetExceeded:
+            return self.best_guess(topic)
+        # A plan that fails the schema is asked again a model tier up.
+        stronger = escalated(self) if "error" in plan else None
+        return stronger.plan(topic) if stronger else plan
+
+    @traced("plan")
+    async def aplan(self, topic):
+        try:
+            with agent_budget("PlannerAgent"):
+                messages, options = self.prompt.inputs(topic=topic)
+                response = await self.llm.ainvoke(messages, **options)
+        except BudgetExceeded:
+            return self.best_guess(topic)
+        plan = self.parse(response.content)
+        stronger = escalated(self) if "error" in plan else None
+        return await stronger.aplan(topic) if stronger else plan
+
+
+class SynthesisAgent:
+    """Fills a specialist's JSON schema from search results in one model call.
+
+    The prompt is the specialist's own, so the output format and rules stay
+    in one place and its static prefix is shared with the ReAct runs; only
+    the search step is replaced.
+    """
+
+    def __init__(self, tier=None):
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
+
+    # Follows the specialist's own prompt, after the part that varies per call.
+    results_prompt = compact("""
+        # SEARCH RESULTS:
+        {sources}
+
+        The searches above have already been run for you; do not search again.
+        Fill in the OUTPUT FORMAT using only these results and any known facts, and return only the JSON.
+        """)
+
+    def inputs(self, category, topic, results, site=None):
+        agent_cls, _ = SPECIALISTS.get(category) or SPECIALISTS[FALLBACK_CATEGORY]
+        sources = "\n\n".join(f"## {query}\n{result}" for query, result in results.items())
+        return agent_cls.prompt.inputs(
+            extra="\n\n" + self.results_prompt.format(sources=sources),
+            topic=topic,
+            site=site or "the site named in the input",
+        )
+
+    @traced("synthesize")
+    def synthesize(self, category, topic, results, site=None):
+        messages, options = self.inputs(category, topic, results, site)
+        return self.llm.invoke(messages, **options).content
+
+    @traced("synthesize")
+    async def asynthesize(self, category, topic, results, site=None):
+        messages, options = self.inputs(category, topic, results, site)
+        response = await self.llm.ainvoke(messages, **options)
+        return response.content
+
+
+@specialist("General Information", "general_topic")
 class GeneralAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+    # Searches covering the TASKS list below, run side by side in planned mode.
+    search_tasks = [
+        "{site} official website history overview",
+        "{site} location country city founded by year built",
+        "{site} UNESCO World Heritage status year inscribed",
+    ]
+
+    def __init__(self, tier=None):
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
         self.tools = tools
         self.agent = initialize_agent(
             tools=self.tools,
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=False,
-            handle_parsing_errors=True
+            handle_parsing_errors=True,
+            **react_limits(budget_name(self))
         )
 
-    def general_topic(self, topic):
-        prompt = f"""You are an expert Research Agent specialized in gathering GENERAL INFORMATION about heritage sites across the world.
+    prompt = SplitPrompt(
+        "GeneralAgent",
+        static="""You are an expert Research Agent specialized in gathering GENERAL INFORMATION about heritage sites across the world.
 
                       Your task is to search the web and extract clear, concise, and accurate information about a given heritage site and return only FACTUAL details in a structured JSON format. You DO NOT narrate, assume, or summarize creatively. You also DO NOT include opinion, user reviews, or travel blog content.
 
-                      # INPUT:
-                      {topic}
-
                       # TASKS:
                       - Retrieve factual information from credible sources (e.g., UNESCO, official tourism boards, government sites, academic resources).
                       - Extract key general facts including:
@@ -124,54 +824,76 @@ class GeneralAgent:
                         - Official Website (if available)
 
                       # OUTPUT FORMAT (Strict JSON):
-                      {{
+                      {
                         "site": "site",
-                        "location": {{
+                        "location": {
                           "country": "...",
                           "city_or_region": "..."
-                        }},
+                        },
                         "established_year": "...",
                         "founded_by": "...",
                         "historical_significance": "...",
                         "cultural_importance": "...",
-                        "unesco_status": {{
+                        "unesco_status": {
                           "is_unesco_site": true,
                           "designation_year": "..."
-                        }},
+                        },
                         "official_website": "..."
-                      }}
+                      }
 
                       # RULES:
                       - DO NOT include unrelated content, tips, travel advice, or opinions.
                       - NEVER make up facts. If data is missing, write `"unknown"` or `null`.
                       - Avoid promotional or subjective content.
                       - Only output the final structured JSON, no extra text.
+                      """,
+        variable="""
+                      # INPUT:
+                      {topic}
 
-                      Begin researching and return the structured general information for the site: **site**
-                      """
-        response = self.agent.run(prompt)
-        return response
+                      Begin researching and return the structured general information for the site: {site}
+                      """,
+    )
+
+    def build_prompt(self, topic, site=None):
+        return self.prompt.render(topic=topic, site=site or "the site named in the input")
+
+    @traced("research")
+    def general_topic(self, topic, site=None):
+        return self.agent.run(self.build_prompt(topic, site), metadata=self.prompt.metadata)
+
+    @traced("research")
+    async def ageneral_topic(self, topic, site=None):
+        return await self.agent.arun(self.build_prompt(topic, site), metadata=self.prompt.metadata)
     
+@specialist("Location & Accessibility", "locate")
 class LocationAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+    search_tasks = [
+        "{site} location state region nearest city distance km",
+        "how to reach {site} by air train road nearest airport railway station",
+        "{site} wheelchair accessibility senior visitors",
+        "{site} GPS coordinates latitude longitude",
+    ]
+
+    def __init__(self, tier=None):
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
         self.tools = tools
         self.agent = initialize_agent(
             tools=self.tools,
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=False,
-            handle_parsing_errors=True
+            handle_parsing_errors=True,
+            **react_limits(budget_name(self))
         )
 
-    def locate(self, topic):
-        prompt = f"""You are a Research Agent specialized in retrieving precise and factual LOCATION & ACCESSIBILITY information about global heritage sites.
+    prompt = SplitPrompt(
+        "LocationAgent",
+        static="""You are a Research Agent specialized in retrieving precise and factual LOCATION & ACCESSIBILITY information about global heritage sites.
 
                       Your job is to query the web and extract details that help a visitor understand where the heritage site is located and how to reach it. You will output the data in a strictly structured JSON format.
 
-                      # INPUT:
-                      {topic}
-
                       # TASKS:
                       Search and extract the following:
                       - Country and State/Region where the site is located
@@ -183,65 +905,84 @@ class LocationAgent:
                       - Geo-coordinates (latitude and longitude) of the site
 
                       # OUTPUT FORMAT (Strict JSON):
-                      {{
+                      {
                         "site": "site",
-                        "location": {{
+                        "location": {
                           "country": "...",
                           "state_or_region": "...",
                           "nearest_major_city": "...",
                           "distance_from_city_km": "...",
-                          "geo_coordinates": {{
+                          "geo_coordinates": {
                             "latitude": "...",
                             "longitude": "..."
-                          }}
-                        }},
-                        "transportation": {{
+                          }
+                        },
+                        "transportation": {
                           "available_modes": ["road", "rail", "air"],
                           "nearest_airport": "...",
                           "nearest_rail_station": "...",
                           "common_routes": "..."
-                        }},
-                        "accessibility": {{
+                        },
+                        "accessibility": {
                           "wheelchair_accessible": true,
                           "senior_friendly": true,
                           "note": "..."
-                        }}
-                      }}
+                        }
+                      }
 
                       # RULES:
                       - Use ONLY factual info from reliable sources (official tourism boards, Google Maps, transportation sites).
                       - DO NOT add opinions, travel tips, or promotional content.
                       - DO NOT speculate—if a data point is unavailable, use `"unknown"` or `null`.
                       - Only output the final structured JSON, nothing else.
+                      """,
+        variable="""
+                      # INPUT:
+                      {topic}
+
+                      Begin researching and return structured location & accessibility data for: {site}
+                      """,
+    )
+
+    def build_prompt(self, topic, site=None):
+        return self.prompt.render(topic=topic, site=site or "the site named in the input")
 
-                      Begin researching and return structured location & accessibility data for: **site**
+    @traced("research")
+    def locate(self, topic, site=None):
+        return self.agent.run(self.build_prompt(topic, site), metadata=self.prompt.metadata)
 
-                      """
-        response = self.agent.run(prompt)
-        return response
+    @traced("research")
+    async def alocate(self, topic, site=None):
+        return await self.agent.arun(self.build_prompt(topic, site), metadata=self.prompt.metadata)
     
 
+@specialist("Visiting Hours & Timing", "time")
 class TimeAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+    search_tasks = [
+        "{site} opening hours timings official",
+        "{site} closed days holidays last entry time",
+        "{site} night viewing evening program average visit duration",
+    ]
+
+    def __init__(self, tier=None):
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
         self.tools = tools
         self.agent = initialize_agent(
             tools=self.tools,
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=False,
-            handle_parsing_errors=True
+            handle_parsing_errors=True,
+            **react_limits(budget_name(self))
         )
 
-    def time(self, topic):
-        prompt = f"""You are a Research Agent specialized in retrieving precise and factual VISITING HOURS & TIMING information about global heritage sites.
+    prompt = SplitPrompt(
+        "TimeAgent",
+        static="""You are a Research Agent specialized in retrieving precise and factual VISITING HOURS & TIMING information about global heritage sites.
 
                       Your job is to query the web and extract structured information to help travelers know when they can visit the site. You will output the data in a strictly structured JSON format.
 
-                      # INPUT:
-                      {topic}
-
-
                       # TASKS:
                       Search and extract the following:
                       - Opening days (e.g., Monday to Sunday, weekdays only, etc.)
@@ -253,62 +994,82 @@ class TimeAgent:
                       - Special night entry or evening programs (if applicable)
 
                       # OUTPUT FORMAT (Strict JSON):
-                      {{
+                      {
                         "site": "site",
-                        "timing": {{
+                        "timing": {
                           "time_zone": "...",
-                          "weekly_schedule": {{
-                            "monday": {{ "open": "...", "close": "..." }},
-                            "tuesday": {{ "open": "...", "close": "..." }},
-                            "wednesday": {{ "open": "...", "close": "..." }},
-                            "thursday": {{ "open": "...", "close": "..." }},
-                            "friday": {{ "open": "...", "close": "..." }},
-                            "saturday": {{ "open": "...", "close": "..." }},
-                            "sunday": {{ "open": "...", "close": "..." }}
-                          }},
+                          "weekly_schedule": {
+                            "monday": { "open": "...", "close": "..." },
+                            "tuesday": { "open": "...", "close": "..." },
+                            "wednesday": { "open": "...", "close": "..." },
+                            "thursday": { "open": "...", "close": "..." },
+                            "friday": { "open": "...", "close": "..." },
+                            "saturday": { "open": "...", "close": "..." },
+                            "sunday": { "open": "...", "close": "..." }
+                          },
                           "last_entry_time": "...",
                           "closed_on": ["..."],
-                          "special_events": {{
+                          "special_events": {
                             "night_entry_available": "true",
                             "description": "..."
-                          }},
+                          },
                           "average_visit_duration": "..."
-                        }}
-                      }}
+                        }
+                      }
 
                       # RULES:
                       - Use ONLY factual info from official tourism websites or the official site page.
                       - DO NOT include tips, travel suggestions, or opinions.
                       - DO NOT speculate—if data is missing, use `"unknown"` or `null`.
                       - Output ONLY the structured JSON response, nothing else.
+                    """,
+        variable="""
+                      # INPUT:
+                      {topic}
+
+                      Begin researching and return structured visiting hours & timing data for: {site}
+                      """,
+    )
+
+    def build_prompt(self, topic, site=None):
+        return self.prompt.render(topic=topic, site=site or "the site named in the input")
 
-                      Begin researching and return structured visiting hours & timing data for: **site**
+    @traced("research")
+    def time(self, topic, site=None):
+        return self.agent.run(self.build_prompt(topic, site), metadata=self.prompt.metadata)
 
-                    """
-        response = self.agent.run(prompt)
-        return response
+    @traced("research")
+    async def atime(self, topic, site=None):
+        return await self.agent.arun(self.build_prompt(topic, site), metadata=self.prompt.metadata)
     
+@specialist("Tickets & Pricing", "ticket")
 class TicketAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+    search_tasks = [
+        "{site} entry ticket price adult child senior foreigners locals official",
+        "{site} ticket types guided tour fast track discounts free entry",
+        "{site} online ticket booking official website on-site purchase",
+        "{site} camera fee parking fee ticket validity",
+    ]
+
+    def __init__(self, tier=None):
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
         self.tools = tools
         self.agent = initialize_agent(
             tools=self.tools,
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=False,
-            handle_parsing_errors=True
+            handle_parsing_errors=True,
+            **react_limits(budget_name(self))
         )
 
-    def ticket(self, topic):
-        prompt = f"""You are a Research Agent specialized in retrieving precise and factual TICKETS & PRICING information about global heritage sites.
+    prompt = SplitPrompt(
+        "TicketAgent",
+        static="""You are a Research Agent specialized in retrieving precise and factual TICKETS & PRICING information about global heritage sites.
 
                       Your task is to query the web and collect detailed information about entry costs, booking methods, and ticketing rules for the site. Output everything in a strictly structured JSON format.
 
-                      # INPUT:
-                      {topic}
-                     
-
                       # TASKS:
                       Search and extract the following:
                       - General entry ticket prices for adults, children, and seniors (local and foreign)
@@ -321,83 +1082,102 @@ class TicketAgent:
                       - Validity duration of the ticket (e.g., same day, multi-day pass)
 
                       # OUTPUT FORMAT (Strict JSON):
-                      {{
+                      {
                         "site": "site",
-                        "ticketing": {{
+                        "ticketing": {
                           "currency": "...",
-                          "pricing": {{
+                          "pricing": {
                             "local_adult": "...",
                             "local_child": "...",
                             "local_senior": "...",
                             "foreign_adult": "...",
                             "foreign_child": "...",
                             "foreign_senior": "..."
-                          }},
+                          },
                           "ticket_types": [
-                            {{
+                            {
                               "type": "General Admission",
                               "price": "...",
                               "includes": "..."
-                            }},
-                            {{
+                            },
+                            {
                               "type": "Guided Tour",
                               "price": "...",
                               "includes": "..."
-                            }}
+                            }
                           ],
-                          "discounts": {{
+                          "discounts": {
                             "available_for": ["students", "disabled", "residents"],
                             "details": "..."
-                          }},
-                          "booking": {{
+                          },
+                          "booking": {
                             "online_available": true,
                             "official_website": "...",
                             "third_party_sites": ["..."],
                             "on_site_purchase": true
-                          }},
-                          "additional_charges": {{
+                          },
+                          "additional_charges": {
                             "camera_fee": "...",
                             "parking_fee": "...",
                             "special_exhibit_fee": "..."
-                          }},
+                          },
                           "ticket_validity": "..."
-                        }}
-                      }}
+                        }
+                      }
 
                       # RULES:
                       - Pull data only from official or credible sources.
                       - Do NOT include opinions, promotions, or tips.
                       - If any info is not available, use `"unknown"` or `null`.
                       - Output ONLY the final JSON object, no extra text or explanations.
+                      """,
+        variable="""
+                      # INPUT:
+                      {topic}
 
-                      Begin researching and return structured ticket & pricing data for: **site**
+                      Begin researching and return structured ticket & pricing data for: {site}
+                      """,
+    )
 
-                      """
-        response = self.agent.run(prompt)
-        return response
+    def build_prompt(self, topic, site=None):
+        return self.prompt.render(topic=topic, site=site or "the site named in the input")
+
+    @traced("research")
+    def ticket(self, topic, site=None):
+        return self.agent.run(self.build_prompt(topic, site), metadata=self.prompt.metadata)
+
+    @traced("research")
+    async def aticket(self, topic, site=None):
+        return await self.agent.arun(self.build_prompt(topic, site), metadata=self.prompt.metadata)
     
     
+@specialist("Historical & Cultural Insights", "culture")
 class CultureInsightsAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+    search_tasks = [
+        "{site} history construction timeline built by dynasty",
+        "{site} architecture features religious significance legends",
+        "{site} UNESCO designation reason restoration conservation",
+    ]
+
+    def __init__(self, tier=None):
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
         self.tools = tools
         self.agent = initialize_agent(
             tools=self.tools,
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=False,
-            handle_parsing_errors=True
+            handle_parsing_errors=True,
+            **react_limits(budget_name(self))
         )
 
-    def culture(self, topic):
-        prompt = f"""You are a Research Agent specialized in retrieving in-depth HISTORICAL & CULTURAL INSIGHTS about global heritage sites.
+    prompt = SplitPrompt(
+        "CultureInsightsAgent",
+        static="""You are a Research Agent specialized in retrieving in-depth HISTORICAL & CULTURAL INSIGHTS about global heritage sites.
 
                       Your job is to extract meaningful, factual data that explains the site’s origins, cultural relevance, associated traditions, and historical events. Output the data in a strictly structured JSON format.
 
-                      # INPUT:
-                      {topic}
-                    
-
                       # TASKS:
                       Search and extract the following:
                       - Founding history and construction timeline
@@ -410,68 +1190,87 @@ class CultureInsightsAgent:
                       - Notable restoration efforts or historical transitions
 
                       # OUTPUT FORMAT (Strict JSON):
-                      {{
+                      {
                         "site": "site",
-                        "historical_background": {{
+                        "historical_background": {
                           "founded_in": "...",
                           "built_by": "...",
                           "construction_period": "...",
                           "historical_events": ["..."],
                           "dynasties_or_empires": ["..."],
-                          "unesco_status": {{
+                          "unesco_status": {
                             "designated": true,
                             "year": "...",
                             "reason": "..."
-                          }}
-                        }},
-                        "cultural_significance": {{
+                          }
+                        },
+                        "cultural_significance": {
                           "religious_importance": "...",
                           "myths_and_legends": "...",
                           "cultural_identity": "...",
                           "ceremonial_use": "...",
                           "architectural_features": ["..."]
-                        }},
-                        "restoration_and_conservation": {{
+                        },
+                        "restoration_and_conservation": {
                           "major_restoration_years": ["..."],
                           "preservation_status": "...",
                           "governing_body": "..."
-                        }}
-                      }}
+                        }
+                      }
 
                       # RULES:
                       - Pull only from factual, credible sources (UNESCO, official heritage orgs, history archives).
                       - Do NOT invent or assume. If a field is not available, use `"unknown"` or `null`.
                       - Do NOT add personal interpretation or opinion.
                       - Output ONLY the final JSON object, no surrounding text or explanations.
+                      """,
+        variable="""
+                      # INPUT:
+                      {topic}
+
+                      Begin researching and return structured historical & cultural insight data for: {site}
+                      """,
+    )
 
-                      Begin researching and return structured historical & cultural insight data for: **site**
+    def build_prompt(self, topic, site=None):
+        return self.prompt.render(topic=topic, site=site or "the site named in the input")
 
-                      """
-        response = self.agent.run(prompt)
-        return response
+    @traced("research")
+    def culture(self, topic, site=None):
+        return self.agent.run(self.build_prompt(topic, site), metadata=self.prompt.metadata)
+
+    @traced("research")
+    async def aculture(self, topic, site=None):
+        return await self.agent.arun(self.build_prompt(topic, site), metadata=self.prompt.metadata)
     
     
+@specialist("Visitor Tips & Rules", "tips")
 class TipsAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+    search_tasks = [
+        "{site} visitor rules dress code photography prohibited items",
+        "{site} best time to visit crowds tips safety",
+        "{site} visitor restrictions notices families elderly solo travellers",
+    ]
+
+    def __init__(self, tier=None):
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
         self.tools = tools
         self.agent = initialize_agent(
             tools=self.tools,
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=False,
-            handle_parsing_errors=True
+            handle_parsing_errors=True,
+            **react_limits(budget_name(self))
         )
 
-    def tips(self, topic):
-        prompt = f"""You are a Research Agent specialized in retrieving VISITOR TIPS & RULES for global heritage sites.
+    prompt = SplitPrompt(
+        "TipsAgent",
+        static="""You are a Research Agent specialized in retrieving VISITOR TIPS & RULES for global heritage sites.
 
                         Your task is to collect practical, official, and up-to-date information that helps tourists prepare for their visit while respecting local customs and regulations. Your output must be factual and follow the structured JSON format below.
 
-                        # INPUT:
-                        {topic}
-
-
                         # TASKS:
                         Search and extract the following:
                         - General visitor guidelines or rules
@@ -485,62 +1284,83 @@ class TipsAgent:
                         - Official warnings or restrictions due to events, restoration, etc.
 
                         # OUTPUT FORMAT (Strict JSON):
-                        {{
+                        {
                         "site": "site",
-                        "rules": {{
+                        "rules": {
                             "dress_code": "...",
                             "photography_allowed": true,
                             "videography_allowed": false,
                             "prohibited_items": ["..."],
                             "conduct_guidelines": ["..."]
-                        }},
-                        "tips": {{
+                        },
+                        "tips": {
                             "best_visit_times": "...",
                             "peak_hours_to_avoid": "...",
                             "safety_advice": ["..."],
                             "family_friendly": true,
                             "elderly_friendly": true,
                             "solo_travel_tips": ["..."]
-                        }},
-                        "notices": {{
+                        },
+                        "notices": {
                             "temporary_restrictions": "...",
                             "special_guidelines": "..."
-                        }}
-                        }}
+                        }
+                        }
 
                         # RULES:
                         - Use only verified and official sources (e.g., government tourism websites, site management authorities).
                         - Do NOT include user-generated content or personal opinions.
                         - If information is unavailable, return `"unknown"` or `null`.
                         - Output ONLY the structured JSON object—no surrounding text, summary, or explanation.
+                      """,
+        variable="""
+                        # INPUT:
+                        {topic}
+
+                        Begin researching and return structured visitor guidance for: {site}
+                        """,
+    )
 
-                        Begin researching and return structured visitor guidance for: **site**
+    def build_prompt(self, topic, site=None):
+        return self.prompt.render(topic=topic, site=site or "the site named in the input")
 
-                      """
-        response = self.agent.run(prompt)
-        return response
+    @traced("research")
+    def tips(self, topic, site=None):
+        return self.agent.run(self.build_prompt(topic, site), metadata=self.prompt.metadata)
+
+    @traced("research")
+    async def atips(self, topic, site=None):
+        return await self.agent.arun(self.build_prompt(topic, site), metadata=self.prompt.metadata)
     
     
+@specialist("Facilities & Nearby Attractions", "facility")
 class FacilitiesAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+    search_tasks = [
+        "{site} visitor facilities restrooms drinking water food parking visitor center",
+        "hotels near {site} within 10 km",
+        "hospital police station near {site}",
+        "tourist attractions near {site}",
+    ]
+
+    def __init__(self, tier=None):
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
         self.tools = tools
         self.agent = initialize_agent(
             tools=self.tools,
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=False,
-            handle_parsing_errors=True
+            handle_parsing_errors=True,
+            **react_limits(budget_name(self))
         )
 
-    def facility(self, topic):
-        prompt = f"""You are a Research Agent specialized in retrieving factual and updated FACILITIES & NEARBY ATTRACTIONS information about global heritage sites.
+    prompt = SplitPrompt(
+        "FacilitiesAgent",
+        static="""You are a Research Agent specialized in retrieving factual and updated FACILITIES & NEARBY ATTRACTIONS information about global heritage sites.
 
                         Your goal is to help visitors understand what amenities are available on-site and what notable locations or attractions are nearby. You will return data in a strictly structured JSON format.
 
-                        # INPUT:
-                        {topic}
-                        
                         # TASKS:
                         Search and extract the following:
                         - On-site facilities (e.g., restrooms, drinking water, food courts, guided tour booths, wheelchair ramps)
@@ -551,9 +1371,9 @@ class FacilitiesAgent:
                         - Visitor centers or help desks
 
                         # OUTPUT FORMAT (Strict JSON):
-                        {{
+                        {
                         "site": "site",
-                        "facilities": {{
+                        "facilities": {
                             "restrooms": true,
                             "drinking_water": true,
                             "food_courts": true,
@@ -561,65 +1381,83 @@ class FacilitiesAgent:
                             "wheelchair_access": true,
                             "parking_available": true,
                             "visitor_center": true
-                        }},
+                        },
                         "nearby_accommodations": [
-                            {{
+                            {
                             "name": "...",
                             "type": "hotel/homestay/lodge",
                             "distance_km": "...",
                             "contact": "..."
-                            }}
+                            }
                         ],
-                        "emergency_services": {{
+                        "emergency_services": {
                             "nearest_hospital": "...",
                             "hospital_distance_km": "...",
                             "police_station": "...",
                             "police_distance_km": "..."
-                        }},
+                        },
                         "nearby_attractions": [
-                            {{
+                            {
                             "name": "...",
                             "type": "temple/museum/park/etc.",
                             "distance_km": "..."
-                            }}
+                            }
                         ]
-                        }}
+                        }
 
                         # RULES:
                         - Rely ONLY on reliable and verifiable sources such as Google Maps, official tourism websites, or local government listings.
                         - DO NOT speculate—if any information is not available, return `"unknown"` or `null`.
                         - DO NOT include suggestions, reviews, or tips—only factual data.
                         - Output ONLY the structured JSON—no explanation, summary, or prose.
+                      """,
+        variable="""
+                        # INPUT:
+                        {topic}
 
-                        Begin researching and return structured facilities and nearby attractions data for: **site**
+                        Begin researching and return structured facilities and nearby attractions data for: {site}
+                        """,
+    )
 
-                      """
-        response = self.agent.run(prompt)
-        return response
+    def build_prompt(self, topic, site=None):
+        return self.prompt.render(topic=topic, site=site or "the site named in the input")
+
+    @traced("research")
+    def facility(self, topic, site=None):
+        return self.agent.run(self.build_prompt(topic, site), metadata=self.prompt.metadata)
+
+    @traced("research")
+    async def afacility(self, topic, site=None):
+        return await self.agent.arun(self.build_prompt(topic, site), metadata=self.prompt.metadata)
     
 
+@specialist("Custom Experience", "experience")
 class ExperienceAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+    search_tasks = [
+        "{site} guided tours official private themed languages booking",
+        "{site} sunrise sunset exclusive experiences special access",
+        "{site} festivals seasonal events activities for families",
+    ]
+
+    def __init__(self, tier=None):
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
         self.tools = tools
         self.agent = initialize_agent(
             tools=self.tools,
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=False,
-            handle_parsing_errors=True
+            handle_parsing_errors=True,
+            **react_limits(budget_name(self))
         )
 
-    def experience(self, topic):
-        prompt = f"""You are a Research Agent specialized in retrieving information for CUSTOM EXPERIENCE planning related to global heritage sites.
+    prompt = SplitPrompt(
+        "ExperienceAgent",
+        static="""You are a Research Agent specialized in retrieving information for CUSTOM EXPERIENCE planning related to global heritage sites.
 
                         Your job is to extract data that helps travelers design a personalized, unique, and meaningful visit to a heritage site. Output must be in a structured JSON format.
 
-                        # INPUT:
-                        - Heritage Site: {topic}
-                        - Language: English
-                        - Category: Custom Experience
-
                         # TASKS:
                         Search and extract the following:
                         - Available guided tours (official, private, or themed tours like photography, cultural immersion, etc.)
@@ -629,77 +1467,96 @@ class ExperienceAgent:
                         - Booking channels for custom packages (official website, licensed tour operators)
 
                         # OUTPUT FORMAT (Strict JSON):
-                        {{
+                        {
                         "site": "site",
-                        "custom_experiences": {{
+                        "custom_experiences": {
                             "guided_tours": [
-                            {{
+                            {
                                 "name": "...",
                                 "type": "official/private/themed",
                                 "duration_hours": "...",
                                 "available_languages": ["English", "..."],
                                 "booking_link": "..."
-                            }}
+                            }
                             ],
                             "exclusive_experiences": [
-                            {{
+                            {
                                 "name": "...",
                                 "description": "...",
                                 "best_time": "..."
-                            }}
+                            }
                             ],
-                            "tailored_activities": {{
+                            "tailored_activities": {
                             "for_families": "...",
                             "for_solo_travelers": "...",
                             "for_seniors": "..."
-                            }},
+                            },
                             "seasonal_events": [
-                            {{
+                            {
                                 "event_name": "...",
                                 "description": "...",
                                 "season": "..."
-                            }}
+                            }
                             ],
                             "booking_channels": ["...", "..."]
-                        }}
-                        }}
+                        }
+                        }
 
                         # RULES:
                         - Only use verified sources such as tourism boards, official tour sites, and travel platforms.
                         - Avoid opinions, marketing phrases, or general travel advice.
                         - Use `"unknown"` or `null` if any field cannot be found.
                         - Do NOT output anything outside the structured JSON block.
+                      """,
+        variable="""
+                        # INPUT:
+                        - Heritage Site: {topic}
+                        - Language: English
+                        - Category: Custom Experience
+
+                        Begin researching and return structured custom experience data for: {site}
+                        """,
+    )
+
+    def build_prompt(self, topic, site=None):
+        return self.prompt.render(topic=topic, site=site or "the site named in the input")
 
-                        Begin researching and return structured custom experience data for: **site**
+    @traced("research")
+    def experience(self, topic, site=None):
+        return self.agent.run(self.build_prompt(topic, site), metadata=self.prompt.metadata)
 
-                      """
-        response = self.agent.run(prompt)
-        return response
+    @traced("research")
+    async def aexperience(self, topic, site=None):
+        return await self.agent.arun(self.build_prompt(topic, site), metadata=self.prompt.metadata)
     
     
     
+@specialist("Comparison & Recommendations", "recommend")
 class RecommendationAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+    search_tasks = [
+        "heritage sites similar to {site} comparison",
+        "places to visit near {site} recommended",
+    ]
+
+    def __init__(self, tier=None):
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
         self.tools = tools
         self.agent = initialize_agent(
             tools=self.tools,
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=False,
-            handle_parsing_errors=True
+            handle_parsing_errors=True,
+            **react_limits(budget_name(self))
         )
 
-    def recommend(self, topic):
-        prompt = f"""You are a Research Agent specialized in retrieving COMPARISONS and RECOMMENDATIONS involving global heritage sites.
+    prompt = SplitPrompt(
+        "RecommendationAgent",
+        static="""You are a Research Agent specialized in retrieving COMPARISONS and RECOMMENDATIONS involving global heritage sites.
 
                         Your job is to extract factual, non-opinionated comparisons between a given heritage site and other similar or nearby heritage sites. You also identify and suggest related sites worth visiting based on location, theme, or cultural context. Output must be structured in the JSON format below.
 
-                        # INPUT:
-                        - Heritage Site: {topic}
-                        - Language: English
-                        - Category: Comparison & Recommendations
-
                         # TASKS:
                         Search and extract the following:
                         - Comparisons between the input site and other similar heritage sites (based on architecture, time period, cultural significance, or visitor experience)
@@ -708,58 +1565,78 @@ class RecommendationAgent:
                         - Reason for each recommendation (e.g., architectural style, religious theme, UNESCO status, accessibility)
 
                         # OUTPUT FORMAT (Strict JSON):
-                        {{
+                        {
                         "site": "site",
                         "comparisons": [
-                            {{
+                            {
                             "compared_with": "...",
                             "similarities": ["..."],
                             "differences": ["..."]
-                            }}
+                            }
                         ],
                         "recommendations": [
-                            {{
+                            {
                             "site_name": "...",
                             "location": "...",
                             "reason_for_recommendation": "..."
-                            }}
+                            }
                         ]
-                        }}
+                        }
 
                         # RULES:
                         - Use only factual data from reliable sources like UNESCO, heritage tourism boards, cultural studies, or historical records.
                         - Do NOT include subjective opinions or traveler reviews.
                         - If comparison data is limited, keep fields minimal or use `"unknown"` or `null`.
                         - Do NOT generate narrative content—return only the final JSON block.
+                      """,
+        variable="""
+                        # INPUT:
+                        - Heritage Site: {topic}
+                        - Language: English
+                        - Category: Comparison & Recommendations
+
+                        Begin researching and return structured comparison & recommendation data for: {site}
+                        """,
+    )
+
+    def build_prompt(self, topic, site=None):
+        return self.prompt.render(topic=topic, site=site or "the site named in the input")
 
-                        Begin researching and return structured comparison & recommendation data for: **site**
+    @traced("research")
+    def recommend(self, topic, site=None):
+        return self.agent.run(self.build_prompt(topic, site), metadata=self.prompt.metadata)
 
-                      """
-        response = self.agent.run(prompt)
-        return response
+    @traced("research")
+    async def arecommend(self, topic, site=None):
+        return await self.agent.arun(self.build_prompt(topic, site), metadata=self.prompt.metadata)
     
 
+@specialist("Language & Culture", "language")
 class LanguageAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+    search_tasks = [
+        "languages spoken near {site} local dialects",
+        "{site} traditions festivals rituals visitor etiquette",
+    ]
+
+    def __init__(self, tier=None):
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
         self.tools = tools
         self.agent = initialize_agent(
             tools=self.tools,
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=False,
-            handle_parsing_errors=True
+            handle_parsing_errors=True,
+            **react_limits(budget_name(self))
         )
 
-    def language(self, topic):
-        prompt = f"""You are a Research Agent specialized in retrieving LANGUAGE & CULTURE-related information for global heritage sites.
+    prompt = SplitPrompt(
+        "LanguageAgent",
+        static="""You are a Research Agent specialized in retrieving LANGUAGE & CULTURE-related information for global heritage sites.
 
                         Your task is to extract accurate data that helps a visitor understand the linguistic and cultural context of the heritage site. Output your findings strictly in the JSON format below.
 
-                        # INPUT:
-                        {topic}
-                        
-
                         # TASKS:
                         Search and extract the following:
                         - Primary and secondary languages spoken in the region of the heritage site
@@ -770,53 +1647,76 @@ class LanguageAgent:
                         - Etiquette or behavior expectations for visitors (dress code, greetings, taboos, etc.)
 
                         # OUTPUT FORMAT (Strict JSON):
-                        {{
+                        {
                         "site": "site",
-                        "language": {{
+                        "language": {
                             "primary": "...",
                             "secondary": ["...", "..."],
                             "local_dialects": ["...", "..."]
-                        }},
-                        "culture": {{
+                        },
+                        "culture": {
                             "associated_traditions": ["...", "..."],
                             "festivals_or_rituals": ["...", "..."],
                             "religious_significance": "...",
                             "visitor_etiquette": ["...", "..."]
-                        }}
-                        }}
+                        }
+                        }
 
                         # RULES:
                         - Use only verifiable sources (official cultural tourism boards, local government, UNESCO, academic sources).
                         - Do NOT generate folklore, speculative traditions, or fictional details.
                         - If information is not available, use `"unknown"` or `null`.
                         - Return ONLY the structured JSON—no additional text or explanation.
+                      """,
+        variable="""
+                        # INPUT:
+                        {topic}
+
+                        Begin researching and return structured language & culture data for: {site}
+                        """,
+    )
+
+    def build_prompt(self, topic, site=None):
+        return self.prompt.render(topic=topic, site=site or "the site named in the input")
 
-                        Begin researching and return structured language & culture data for: **site**
+    @traced("research")
+    def language(self, topic, site=None):
+        return self.agent.run(self.build_prompt(topic, site), metadata=self.prompt.metadata)
 
-                      """
-        response = self.agent.run(prompt)
-        return response
+    @traced("research")
+    async def alanguage(self, topic, site=None):
+        return await self.agent.arun(self.build_prompt(topic, site), metadata=self.prompt.metadata)
     
     
 class WriterAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
-        self.tools = tools
-        self.agent = initialize_agent(
-            tools=self.tools,
-            llm=self.llm,
-            agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-            verbose=True,
-            handle_parsing_errors=True
-        )
+    """Turns specialist JSON into the published article.
 
-    def write_article(self, research):
-        prompt = f"""You are a professional Travel & Culture Content Writer Agent.
+    In "direct" mode (the default) this is one templated LLM call with no
+    tools. "react" keeps the original tool-using agent loop; pick it with
+    WRITER_MODE=react.
+    """
 
-                        Your task is to convert structured research data into a clear, polished, and engaging description for readers interested in visiting or learning about heritage sites. Write professionally, avoid fluff or exaggeration, and focus strictly on the provided facts.
+    def __init__(self, mode=None, tier=None):
+        self.mode = mode or os.getenv("WRITER_MODE", "direct")
+        self.tier = tier or model_tier(self)
+        self.llm = chat_model(self.tier)
+        self.tools = tools
+        self.agent = None
+        if self.mode == "react":
+            self.agent = initialize_agent(
+                tools=self.tools,
+                llm=self.llm,
+                agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+                verbose=False,
+                handle_parsing_errors=True,
+                **react_limits(budget_name(self))
+            )
+
+    prompt = SplitPrompt(
+        "WriterAgent",
+        static="""You are a professional Travel & Culture Content Writer Agent.
 
-                        # INPUT:
-                        {research}
+                        Your task is to convert structured research data into a clear, polished, and engaging description for readers interested in visiting or learning about heritage sites. Write professionally, avoid fluff or exaggeration, and focus strictly on the provided facts.
 
                         # INSTRUCTIONS:
                         1. Use ONLY the data given in the JSON—do not make up any facts.
@@ -830,11 +1730,91 @@ class WriterAgent:
                         - Well-organized and logically structured.
                         - Faithful to the structured data.
                         - Ready to be published on a heritage site info page or travel portal.
+                        """,
+        variable="""
+                        # INPUT:
+                        {research}
 
-                        Now, write a polished informational passage for the category **category** at **site** using the data above.
+                        Now, write a polished informational passage for {subject} using the data above.
+                        """,
+    )
+
+    def values(self, research, category=None, site=None):
+        if category and site:
+            subject = f"the category {category} at {site}"
+        elif category:
+            subject = f"the category {category}"
+        else:
+            subject = site or "this heritage site"
+        return {"research": research, "subject": subject}
+
+    def build_prompt(self, research, category=None, site=None):
+        return self.prompt.render(**self.values(research, category, site))
+
+    def fallback(self, research, exc):
+        """Stand-in article when the writer runs out of budget: the research itself."""
+        return (
+            f"The full article could not be written within its budget ({exc}). "
+            f"Here is the research it would have been based on:\n\n{research}"
+        )
 
-        
-        
+    @traced("write")
+    def write_article(self, research, category=None, site=None):
+        try:
+            with agent_budget("WriterAgent") as budget:
+                if self.agent is not None:
+                    article = self.agent.run(self.build_prompt(research, category, site), metadata=self.prompt.metadata)
+                    budget.audit()
+                    return article
+                messages, options = self.prompt.inputs(**self.values(research, category, site))
+                return self.llm.invoke(messages, **options).content
+        except BudgetExceeded as exc:
+            return self.fallback(research, exc)
+
+    @traced("write")
+    async def awrite_article(self, research, category=None, site=None):
+        try:
+            with agent_budget("WriterAgent") as budget:
+                if self.agent is not None:
+                    article = await self.agent.arun(self.build_prompt(research, category, site), metadata=self.prompt.metadata)
+                    budget.audit()
+                    return article
+                messages, options = self.prompt.inputs(**self.values(research, category, site))
+                response = await self.llm.ainvoke(messages, **options)
+                return response.content
+        except BudgetExceeded as exc:
+            return self.fallback(research, exc)
+
+    @traced("write")
+    def stream_article(self, research, category=None, site=None):
+        """Yield the article in chunks as the model generates it.
+
+        The ReAct mode cannot stream its final answer, so it yields the whole
+        article once at the end.
         """
-        response = self.agent.run(prompt)
-        return response
\ No newline at end of file
+        try:
+            with agent_budget("WriterAgent"):
+                if self.agent is not None:
+                    yield self.agent.run(self.build_prompt(research, category, site), metadata=self.prompt.metadata)
+                    return
+                messages, options = self.prompt.inputs(**self.values(research, category, site))
+                for chunk in self.llm.stream(messages, **options):
+                    if chunk.content:
+                        yield chunk.content
+        except BudgetExceeded as exc:
+            yield "\n\n" + self.fallback(research, exc)
+
+    @traced("write")
+    async def astream_article(self, research, category=None, site=None):
+        try:
+            with agent_budget("WriterAgent"):
+                if self.agent is not None:
+                    yield await self.agent.arun(self.build_prompt(research, category, site), metadata=self.prompt.metadata)
+                    return
+                messages, options = self.prompt.inputs(**self.values(research, category, site))
+                async for chunk in self.llm.astream(messages, **options):
+                    if chunk.content:
+                        yield chunk.content
+        except BudgetExceeded as exc:
+            yield "\n\n" + self.fallback(research, exc)
+
@@ -0,0 +1,150 @@
+"""HTTP API for the heritage pipeline.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+POST /ask          {"query": "..."} -> the pipeline result as JSON
+POST /ask/stream   {"query": "..."} -> newline-delimited JSON events (see pipeline.ask_stream)
+GET  /metrics      Prometheus text
+GET  /healthz      liveness
+
+At most API_MAX_IN_FLIGHT requests run at once and API_MAX_QUEUE more may
+wait for a slot; anything beyond that gets 429 with a Retry-After header.
+"""
+import asyncio
+import contextlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+import pipeline
+from metrics import metrics
+
+
+class Saturated(Exception):
+    pass
+
+
+class Admission:
+    """Bounded concurrency with a bounded wait queue; rejects instead of piling up."""
+
+    def __init__(self, max_in_flight, max_queue):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._admitted = 0
+        self.rejected = 0
+
+    def check(self):
+        """Raise Saturated if a request arriving now would be rejected."""
+        if self._admitted >= self.max_in_flight + self.max_queue:
+            self.rejected += 1
+            raise Saturated()
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        self.check()
+        self._admitted += 1
+        try:
+            async with self._slots:
+                yield
+        finally:
+            self._admitted -= 1
+
+    def stats(self):
+        return {
+            "admitted": self._admitted,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+
+admission = Admission(
+    max_in_flight=int(os.getenv("API_MAX_IN_FLIGHT", "32")),
+    max_queue=int(os.getenv("API_MAX_QUEUE", "64")),
+)
+metrics.register_collector("api", admission.stats)
+
+RETRY_AFTER = os.getenv("API_RETRY_AFTER", "5")
+
+
+def _busy():
+    return JSONResponse({"detail": "server busy, retry later"}, status_code=429, headers={"Retry-After": RETRY_AFTER})
+
+
+async def _query(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    query = body.get("query") if isinstance(body, dict) else None
+    if not isinstance(query, str) or not query.strip():
+        return None
+    return query.strip()
+
+
+async def ask(request):
+    query = await _query(request)
+    if query is None:
+        return JSONResponse({"detail": 'body must be {"query": "<question>"}'}, status_code=400)
+    try:
+        async with admission.slot():
+            return JSONResponse(await pipeline.aask(query))
+    except Saturated:
+        return _busy()
+
+
+async def ask_stream(request):
+    query = await _query(request)
+    if query is None:
+        return JSONResponse({"detail": 'body must be {"query": "<question>"}'}, status_code=400)
+    # Saturation is still a clean 429 up front, but the slot itself is taken
+    # inside the body: a generator that never starts (the client left before
+    # Starlette iterated it) never runs its cleanup, so it must hold nothing.
+    try:
+        admission.check()
+    except Saturated:
+        return _busy()
+
+    async def events():
+        try:
+            async with admission.slot():
+                async for event in pipeline.aask_stream(query):
+                    yield json.dumps(event, ensure_ascii=False) + "\n"
+        except Saturated:
+            yield json.dumps({"event": "error", "detail": "server busy, retry later"}) + "\n"
+        except Exception as exc:
+            yield json.dumps({"event": "error", "detail": repr(exc)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+async def metrics_endpoint(request):
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+async def healthz(request):
+    return JSONResponse({"status": "ok"})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Sync work inside async agents (tool calls, SQLite caches) runs on this bounded pool.
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=int(os.getenv("API_WORKERS", "16"))))
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/ask", ask, methods=["POST"]),
+        Route("/ask/stream", ask_stream, methods=["POST"]),
+        Route("/metrics", metrics_endpoint),
+        Route("/healthz", healthz),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,174 @@
+"""Answer a JSONL file of heritage questions in bulk.
+
+    python batch.py queries.jsonl answers.jsonl --concurrency 16 --llm-rps 5 --search-rps 2
+
+Each input line is {"query": "...", "id": "..."} (id defaults to the line
+number). Results are appended to the output file as they finish, one line
+per query with "status" "ok" or "error". Re-running with the same output
+file skips queries that already succeeded, so an interrupted run resumes
+where it stopped.
+
+Queries close enough to one answered before (see semantic.py) are written
+straight from the question cache. Every other query is categorized and
+answered in its own task, so results (and the resume checkpoint) build up
+as the run goes and one failure only costs that query. Research for the
+same (category, site) is fetched once and shared by every query that needs
+it, even while those queries are still running.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from agents import WriterAgent, get_agent, resolve_categories
+from budgets import request_budget
+from pipeline import acategorize, aresearch_facet, as_of, merge_research, recall, remember
+from ratelimit import set_rates
+
+
+def read_queries(path):
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"query": item}
+            item.setdefault("id", f"line-{n}")
+            yield item
+
+
+def completed_ids(path):
+    """Ids that already have an "ok" line in the output file."""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by an interrupted run; that query is redone.
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+class BatchRunner:
+    def __init__(self, output, concurrency):
+        self.writer = get_agent(WriterAgent)
+        self.output = output
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.write_lock = asyncio.Lock()
+        self.research_tasks = {}
+        self.done = 0
+        self.failed = 0
+        self.shared = 0
+        self.recalled = 0
+
+    def _research(self, item, response, category):
+        key = response["site_id"]
+        if not key:
+            return asyncio.ensure_future(self._bounded(aresearch_facet(item["query"], response, category)))
+        task = self.research_tasks.get((category, key))
+        if task is None:
+            task = asyncio.ensure_future(self._bounded(aresearch_facet(item["query"], response, category)))
+            self.research_tasks[(category, key)] = task
+            task.add_done_callback(lambda task: self._forget_failed((category, key), task))
+        else:
+            self.shared += 1
+        return task
+
+    def _forget_failed(self, key, task):
+        """Drop failed research, so later queries for the same facet try it again."""
+        if (task.cancelled() or task.exception() is not None) and self.research_tasks.get(key) is task:
+            del self.research_tasks[key]
+
+    async def _bounded(self, coro):
+        async with self.semaphore:
+            return await coro
+
+    async def _answer(self, item):
+        try:
+            with request_budget() as budget:
+                async with self.semaphore:
+                    response = await acategorize(item["query"])
+                categories = resolve_categories(response)
+                site = response.get("site")
+                results = dict(zip(categories, await asyncio.gather(
+                    *(self._research(item, response, c) for c in categories)
+                )))
+                data = merge_research(results)
+                async with self.semaphore:
+                    article = await self.writer.awrite_article(data, ", ".join(categories), site)
+            result = {
+                "category": categories[0], "categories": categories,
+                "site": site, "site_id": response["site_id"],
+                "research": data, "article": article, "as_of": as_of(results),
+                "budget": budget.report(),
+            }
+            remember(item["query"], response, result)
+            record = {"id": item["id"], "query": item["query"], "status": "ok", **result}
+            self.done += 1
+        except Exception as exc:
+            record = {"id": item["id"], "query": item["query"], "status": "error", "error": repr(exc)}
+            self.failed += 1
+        await self._append(record)
+
+    async def _append(self, record):
+        async with self.write_lock:
+            self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.output.flush()
+
+    async def _recalled(self, item, cached):
+        cached.pop("topic")
+        await self._append({"id": item["id"], "query": item["query"], "status": "ok", **cached})
+        self.done += 1
+        self.recalled += 1
+
+    async def run(self, items):
+        pending = []
+        for item in items:
+            cached = recall(item["query"])
+            if cached is None:
+                pending.append(item)
+            else:
+                await self._recalled(item, cached)
+        await asyncio.gather(*(self._answer(item) for item in pending))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file of queries")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=8, help="model/agent calls in flight")
+    parser.add_argument("--llm-rps", type=float, help="Gemini requests per second")
+    parser.add_argument("--search-rps", type=float, help="SerpAPI requests per second")
+    parser.add_argument("--no-resume", action="store_true", help="redo queries already in the output")
+    args = parser.parse_args()
+
+    set_rates(gemini=args.llm_rps, serpapi=args.search_rps)
+
+    skip = set() if args.no_resume else completed_ids(args.output)
+    items = [item for item in read_queries(args.input) if item["id"] not in skip]
+    print(f"{len(items)} queries to run, {len(skip)} already done", file=sys.stderr)
+
+    start = time.perf_counter()
+    with open(args.output, "a", encoding="utf-8") as output:
+        runner = BatchRunner(output, args.concurrency)
+        asyncio.run(runner.run(items))
+    print(
+        f"{runner.done} ok ({runner.recalled} from the question cache), {runner.failed} failed, "
+        f"{runner.shared} research lookups shared "
+        f"in {time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+    sys.exit(1 if runner.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Benchmark queries built from the example queries in main.py."""
+
+# main.py's example_queries with the site swapped for a placeholder.
+TEMPLATES = [
+    "Tell me about the {site}.",
+    "Where is {site} located?",
+    "What are the opening hours of the {site}?",
+    "How much is the entry fee for the {site}?",
+    "Who built the {site} and why?",
+    "What should I wear when visiting the {site}?",
+    "What can I see near the {site}?",
+    "Can I get a private tour of the {site}?",
+    "Which is better to visit—{site} or {other}?",
+    "What language is spoken at {site}?",
+]
+
+SITES = [
+    "Taj Mahal", "Angkor Wat", "Louvre", "Acropolis", "Pyramids of Giza",
+    "Golden Temple", "Eiffel Tower", "Red Fort", "Hampi", "Colosseum",
+]
+
+
+def queries(count=None):
+    """Every template crossed with every site, cycled or cut to `count` queries."""
+    corpus = [
+        template.format(site=site, other=SITES[(i + 1) % len(SITES)])
+        for i, site in enumerate(SITES)
+        for template in TEMPLATES
+    ]
+    if count is None:
+        return corpus
+    return [corpus[i % len(corpus)] for i in range(count)]
@@ -0,0 +1,178 @@
+"""Deterministic stand-ins for Gemini and SerpAPI so the pipeline can be timed offline."""
+import asyncio
+import json
+import re
+import threading
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from classifier import IntentClassifier
+from parsing import SCHEMAS
+
+
+# Phrases that identify which agent built the prompt.
+_SPECIALIST_MARKERS = {
+    "GENERAL INFORMATION": "General Information",
+    "LOCATION & ACCESSIBILITY": "Location & Accessibility",
+    "VISITING HOURS & TIMING": "Visiting Hours & Timing",
+    "TICKETS & PRICING": "Tickets & Pricing",
+    "HISTORICAL & CULTURAL INSIGHTS": "Historical & Cultural Insights",
+    "VISITOR TIPS & RULES": "Visitor Tips & Rules",
+    "FACILITIES & NEARBY ATTRACTIONS": "Facilities & Nearby Attractions",
+    "CUSTOM EXPERIENCE": "Custom Experience",
+    "COMPARISONS and RECOMMENDATIONS": "Comparison & Recommendations",
+    "LANGUAGE & CULTURE": "Language & Culture",
+}
+
+ARTICLE = " ".join(["The site is open to visitors and well worth the trip."] * 12)
+
+
+class Counters:
+    """Call counts shared by every fake backend in the process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.llm_calls = 0
+        self.search_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "llm_calls": self.llm_calls,
+                "search_calls": self.search_calls,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+            }
+
+
+counters = Counters()
+_classifier = IntentClassifier()
+
+
+def sample(schema):
+    """A filled-in instance of a parsing schema used as a canned specialist answer."""
+    if isinstance(schema, dict):
+        return {key: sample(sub) for key, sub in schema.items()}
+    if isinstance(schema, list):
+        return [sample(schema[0])]
+    return True if schema is bool else "sample"
+
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+
+def respond(prompt, search_steps):
+    """The canned reply for `prompt`, chosen by which agent wrote it."""
+    if "Categorizer AI Agent" in prompt or "Research Planner Agent" in prompt:
+        query = re.findall(r'"([^"]*)"\s*$', prompt.strip())
+        result, _ = _classifier.predict(query[0] if query else prompt)
+        if "Research Planner Agent" in prompt:
+            result["searches"] = [
+                {"category": category, "query": f"{result['site']} {category} {step}"}
+                for category in result["categories"]
+                for step in range(max(1, search_steps))
+            ]
+        return json.dumps(result)
+    if "Content Writer Agent" in prompt:
+        return f"Thought: I can write it now.\nFinal Answer: {ARTICLE}" if "Thought:" in prompt else ARTICLE
+    category = next(
+        (name for marker, name in _SPECIALIST_MARKERS.items() if marker in prompt),
+        "General Information",
+    )
+    answer = json.dumps(sample(SCHEMAS[category]))
+    if "Thought:" not in prompt:
+        return answer
+    # ReAct agent: the template mentions "Observation:" once; every search adds one more.
+    step = prompt.count("Observation:") - 1
+    if step < search_steps:
+        topic = re.search(r"# INPUT:\s*\n\s*(?:- Heritage Site:\s*)?(.+)", prompt)
+        query = f"{topic.group(1).strip() if topic else category} {category} {step}"
+        return f"Thought: I should search.\nAction: Web Search\nAction Input: {query}"
+    return f"Thought: I now know the final answer.\nFinal Answer: {answer}"
+
+
+class FakeChatModel(BaseChatModel):
+    """Replaces ChatGoogleGenerativeAI with canned replies after a fixed delay."""
+
+    model: str = "fake"
+    latency: float = 0.0
+    search_steps: int = 2
+
+    @property
+    def _llm_type(self):
+        return "fake-gemini"
+
+    def _reply(self, messages):
+        # Direct calls send the static part of a prompt as a system message.
+        prompt = "\n\n".join(message.content for message in messages)
+        text = respond(prompt, self.search_steps)
+        usage = {
+            "input_tokens": _tokens(prompt),
+            "output_tokens": _tokens(text),
+            "total_tokens": _tokens(prompt) + _tokens(text),
+        }
+        counters.add(llm_calls=1, input_tokens=usage["input_tokens"], output_tokens=usage["output_tokens"])
+        return text, usage
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        time.sleep(self.latency)
+        text, usage = self._reply(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        await asyncio.sleep(self.latency)
+        text, usage = self._reply(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        time.sleep(self.latency)
+        text, _ = self._reply(messages)
+        for word in text.split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        await asyncio.sleep(self.latency)
+        text, _ = self._reply(messages)
+        for word in text.split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+class FakeSearch:
+    """Replaces SerpAPIWrapper with a fixed snippet after a fixed delay."""
+
+    latency = 0.0
+
+    def run(self, query):
+        time.sleep(self.latency)
+        counters.add(search_calls=1)
+        return f"Search results for {query}: official site, opening hours, ticket prices."
+
+
+def install(llm_latency=0.0, search_latency=0.0, search_steps=2):
+    """Point agents.py and search.py at the fakes. Call before any agent is built."""
+    import agents
+    import search
+
+    steps = search_steps
+
+    # A class rather than a factory, so agents.chat_model can subclass it.
+    class ConfiguredFakeChatModel(FakeChatModel):
+        latency: float = llm_latency
+        search_steps: int = steps
+
+    FakeSearch.latency = search_latency
+    agents.ChatGoogleGenerativeAI = ConfiguredFakeChatModel
+    search.SerpAPIWrapper = FakeSearch
+    return counters
@@ -0,0 +1,152 @@
+"""Offline pipeline benchmark with fake Gemini and SerpAPI backends.
+
+    python -m benchmarks.run --requests 200 --concurrency 16 --output bench.json
+    python -m benchmarks.run --compare bench.json
+    python -m benchmarks.run --pipeline fused --compare bench.json
+    python -m benchmarks.run --specialists planned --compare bench.json
+
+Reports p50/p95/p99 latency, LLM and search calls per request and peak
+Python memory, and writes them to a JSON file for comparing versions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import fakes
+from benchmarks.corpus import queries
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _timed(fn, topic):
+    start = time.perf_counter()
+    fn(topic)
+    return time.perf_counter() - start
+
+
+async def _atimed(fn, topic, semaphore):
+    async with semaphore:
+        start = time.perf_counter()
+        await fn(topic)
+        return time.perf_counter() - start
+
+
+def run(topics, concurrency, mode):
+    import pipeline
+
+    if mode == "async":
+        async def main():
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(_atimed(pipeline.aask, t, semaphore) for t in topics))
+        return asyncio.run(main())
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(lambda t: _timed(pipeline.ask, t), topics))
+
+
+def bench(args):
+    os.environ.setdefault("METRICS_LOG", "off")
+    # Read when pipeline and agents are first imported, in run().
+    os.environ["PIPELINE_MODE"] = args.pipeline
+    os.environ["SPECIALIST_MODE"] = args.specialists
+    # Fresh caches, fact store, site index and question cache per run unless given, so results do not leak between runs.
+    state = tempfile.mkdtemp()
+    os.environ.setdefault("RESEARCH_CACHE_PATH", os.path.join(state, "research.sqlite3"))
+    os.environ.setdefault("FACT_STORE_PATH", os.path.join(state, "facts.sqlite3"))
+    os.environ.setdefault("SITE_INDEX_PATH", os.path.join(state, "sites.sqlite3"))
+    os.environ.setdefault("SEMANTIC_CACHE_PATH", os.path.join(state, "semantic_cache.json"))
+    counters = fakes.install(args.llm_latency, args.search_latency, args.search_steps)
+    topics = queries(args.requests)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    latencies = run(topics, args.concurrency, args.mode)
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    calls = counters.snapshot()
+    n = len(topics)
+    return {
+        "revision": _git_revision(),
+        "config": vars(args),
+        "requests": n,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(n / wall, 2),
+        "latency_s": {
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+        },
+        "llm_calls_per_request": round(calls["llm_calls"] / n, 3),
+        "search_calls_per_request": round(calls["search_calls"] / n, 3),
+        "input_tokens_per_request": round(calls["input_tokens"] / n, 1),
+        "output_tokens_per_request": round(calls["output_tokens"] / n, 1),
+        "peak_memory_mb": round(peak / 2 ** 20, 2),
+    }
+
+
+def compare(baseline, current, tolerance):
+    """Print metric deltas; return False if p95 latency or call counts regressed."""
+    ok = True
+    for key in ("p50", "p95", "p99"):
+        before, after = baseline["latency_s"][key], current["latency_s"][key]
+        print(f"latency {key}: {before}s -> {after}s")
+        if key == "p95" and after > before * (1 + tolerance):
+            ok = False
+    for key in ("llm_calls_per_request", "search_calls_per_request", "peak_memory_mb"):
+        before, after = baseline[key], current[key]
+        print(f"{key}: {before} -> {after}")
+        if key != "peak_memory_mb" and after > before * (1 + tolerance):
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mode", choices=("sync", "async"), default="sync")
+    parser.add_argument("--pipeline", choices=("agents", "fused"), default="agents", help="PIPELINE_MODE to run")
+    parser.add_argument("--specialists", choices=("react", "planned"), default="react", help="SPECIALIST_MODE to run")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.02, help="seconds per fake search")
+    parser.add_argument("--search-steps", type=int, default=2, help="searches per ReAct run or facet plan")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed regression ratio")
+    args = parser.parse_args()
+
+    baseline = args.compare
+    del args.compare
+    result = bench(args)
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+    if baseline:
+        with open(baseline) as f:
+            if not compare(json.load(f), result, args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
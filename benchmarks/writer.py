@@ -0,0 +1,96 @@
+"""Compare WriterAgent's direct and ReAct modes on the same research input.
+
+    python -m benchmarks.writer --runs 5
+
+Needs GOOGLE_API_KEY (and SERPAPI_API_KEY, since the ReAct writer may search)
+unless --offline swaps in the fake backends from benchmarks.fakes.
+"""
+import argparse
+import json
+import statistics
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from agents import WriterAgent
+from benchmarks import fakes
+
+
+SAMPLE_RESEARCH = json.dumps({
+    "site": "Louvre Museum",
+    "ticketing": {
+        "currency": "EUR",
+        "pricing": {"foreign_adult": "22", "foreign_child": "free"},
+        "discounts": {"available_for": ["under 18", "EU residents under 26"], "details": "ID required"},
+        "booking": {"online_available": True, "official_website": "https://www.louvre.fr", "on_site_purchase": True},
+        "ticket_validity": "same day, timed entry",
+    },
+})
+
+
+class UsageCounter(BaseCallbackHandler):
+    """Counts LLM calls, tool calls and token usage reported by the model."""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.llm_calls += 1
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.tool_calls += 1
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+
+
+def _write(writer, research, counter):
+    # Same calls as WriterAgent.write_article, with run-time callbacks so tool
+    # calls inside the ReAct loop are counted too.
+    if writer.agent is not None:
+        return writer.agent.run(writer.build_prompt(research), callbacks=[counter])
+    messages, options = writer.prompt.inputs(**writer.values(research))
+    options["config"] = dict(options["config"], callbacks=[counter])
+    return writer.llm.invoke(messages, **options).content
+
+
+def bench(mode, runs, research=SAMPLE_RESEARCH):
+    writer = WriterAgent(mode=mode)
+    counter = UsageCounter()
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        _write(writer, research, counter)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "mode": mode,
+        "runs": runs,
+        "median_latency_s": round(statistics.median(latencies), 3),
+        "max_latency_s": round(max(latencies), 3),
+        "llm_calls_per_run": counter.llm_calls / runs,
+        "tool_calls_per_run": counter.tool_calls / runs,
+        "input_tokens_per_run": counter.input_tokens / runs,
+        "output_tokens_per_run": counter.output_tokens / runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--offline", action="store_true", help="use fake LLM and search backends")
+    args = parser.parse_args()
+    if args.offline:
+        fakes.install(llm_latency=0.05, search_latency=0.02, search_steps=1)
+    for mode in ("react", "direct"):
+        print(json.dumps(bench(mode, args.runs)))
+
+
+if __name__ == "__main__":
+    main()
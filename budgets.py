@@ -0,0 +1,260 @@
+"""Wall-time, iteration, token and search budgets for agent runs.
+
+Each pipeline request runs inside a request budget, and each agent call
+inside it in an agent budget looked up by category (for specialists) or by
+agent class name. Usage is charged to both. Searches are refused once
+either budget is spent, and model calls are refused once tokens or time
+run out. Callers catch BudgetExceeded and return what they have so far.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+DEFAULT_BUDGET = {
+    "max_iterations": 6,
+    "max_execution_time": 60.0,
+    "max_tokens": 30000,
+    "max_searches": 5,
+}
+
+# Overrides by category or agent class name; missing limits use DEFAULT_BUDGET.
+# The BUDGETS environment variable (JSON of the same shape) overrides these,
+# and its "request" entry overrides REQUEST_BUDGET.
+BUDGETS = {
+    "CategorizerAgent": {"max_iterations": 1, "max_execution_time": 20.0, "max_tokens": 4000, "max_searches": 0},
+    "PlannerAgent": {"max_iterations": 1, "max_execution_time": 20.0, "max_tokens": 6000, "max_searches": 0},
+    "WriterAgent": {"max_iterations": 4, "max_execution_time": 60.0, "max_tokens": 15000, "max_searches": 2},
+    "Visiting Hours & Timing": {"max_iterations": 5, "max_searches": 4},
+    "Tickets & Pricing": {"max_iterations": 7, "max_searches": 6},
+    "Historical & Cultural Insights": {"max_iterations": 7, "max_searches": 6},
+    "Facilities & Nearby Attractions": {"max_iterations": 7, "max_searches": 6},
+    "Comparison & Recommendations": {"max_iterations": 8, "max_searches": 7},
+}
+REQUEST_BUDGET = {"max_execution_time": 180.0, "max_tokens": 120000, "max_searches": 20}
+
+_log = logging.getLogger("heritage.budgets")
+_hits = Counter()
+_hits_lock = threading.Lock()
+
+
+def _overrides():
+    try:
+        return json.loads(os.getenv("BUDGETS", "") or "{}")
+    except ValueError:
+        _log.warning("ignoring BUDGETS: not valid JSON")
+        return {}
+
+
+def budget_for(name):
+    """The limits for an agent, by category or class name."""
+    return {**DEFAULT_BUDGET, **BUDGETS.get(name, {}), **_overrides().get(name, {})}
+
+
+def react_limits(name):
+    """AgentExecutor settings for a ReAct agent under `name`'s budget.
+
+    "generate" makes a stopped agent write a final answer from what it has
+    instead of returning the bare "Agent stopped" message. That answer
+    returns normally, so callers check `Budget.audit` and `truncated`
+    before caching it.
+    """
+    limits = budget_for(name)
+    return {
+        "max_iterations": limits["max_iterations"],
+        "max_execution_time": limits["max_execution_time"],
+        "early_stopping_method": "generate",
+    }
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, scope, limit, used, allowed):
+        super().__init__(f"{scope} exceeded {limit} ({used} of {allowed})")
+        self.scope = scope
+        self.limit = limit
+        self.used = used
+        self.allowed = allowed
+
+
+class Budget:
+    """Usage against limits for one scope; charges also go to the parent scope."""
+
+    def __init__(self, scope, limits, parent=None):
+        self.scope = scope
+        self.limits = limits
+        self.parent = parent
+        self.start = time.monotonic()
+        self.used = Counter()
+        self.exceeded = []
+        # Why the agent in this scope was cut short, if it was; its answer
+        # may be missing what it never got to look up.
+        self.truncated = None
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def _over(self):
+        """The first limit already spent, as (limit, used, allowed), or None."""
+        seconds = self.limits.get("max_execution_time")
+        if seconds is not None and self.elapsed() > seconds:
+            return "max_execution_time", round(self.elapsed(), 1), seconds
+        tokens = self.limits.get("max_tokens")
+        if tokens is not None and self.used["tokens"] >= tokens:
+            return "max_tokens", self.used["tokens"], tokens
+        return None
+
+    def check(self):
+        """Raise BudgetExceeded if this scope or any parent is out of time or tokens."""
+        budget = self
+        while budget is not None:
+            over = budget._over()
+            if over:
+                budget._hit(*over)
+            budget = budget.parent
+
+    def charge(self, **amounts):
+        budget = self
+        while budget is not None:
+            with budget._lock:
+                budget.used.update(amounts)
+            budget = budget.parent
+
+    def take_search(self):
+        """Reserve one search, raising BudgetExceeded if any scope has none left."""
+        try:
+            self.check()
+            budget = self
+            while budget is not None:
+                allowed = budget.limits.get("max_searches")
+                if allowed is not None and budget.used["searches"] >= allowed:
+                    budget._hit("max_searches", budget.used["searches"], allowed)
+                budget = budget.parent
+        except BudgetExceeded as exc:
+            self.truncated = self.truncated or str(exc)
+            raise
+        self.charge(searches=1)
+
+    def audit(self):
+        """Record limits an agent loop stopped itself on, such as max_iterations.
+
+        Each ReAct step is one model call, and "generate" adds one more
+        after the last allowed step.
+        """
+        iterations = self.limits.get("max_iterations")
+        if iterations is not None and self.used["llm_calls"] > iterations:
+            self._stopped(BudgetExceeded(self.scope, "max_iterations", self.used["llm_calls"], iterations))
+        seconds = self.limits.get("max_execution_time")
+        if seconds is not None and self.elapsed() > seconds:
+            self._stopped(BudgetExceeded(self.scope, "max_execution_time", round(self.elapsed(), 1), seconds))
+
+    def _stopped(self, exc):
+        self.truncated = self.truncated or str(exc)
+        self.record(exc)
+
+    def _hit(self, limit, used, allowed):
+        exc = BudgetExceeded(self.scope, limit, used, allowed)
+        self.record(exc)
+        raise exc
+
+    def record(self, exc):
+        """Note a budget hit on the root scope, where the request report is built."""
+        root = self
+        while root.parent is not None:
+            root = root.parent
+        event = {"scope": exc.scope, "limit": exc.limit, "used": exc.used, "allowed": exc.allowed}
+        with root._lock:
+            if event not in root.exceeded:
+                root.exceeded.append(event)
+                with _hits_lock:
+                    _hits[(exc.scope, exc.limit)] += 1
+                _log.warning(json.dumps({"budget_exceeded": event}))
+
+    def report(self):
+        with self._lock:
+            return {
+                "usage": dict(self.used, seconds=round(self.elapsed(), 3)),
+                "limits": dict(self.limits),
+                "exceeded": list(self.exceeded),
+            }
+
+
+def stats():
+    """How often each scope has hit each limit in this process."""
+    with _hits_lock:
+        return {f"{scope}: {limit}": count for (scope, limit), count in _hits.items()}
+
+
+_active = contextvars.ContextVar("heritage_budget", default=None)
+
+
+@contextlib.contextmanager
+def _scope(budget):
+    token = _active.set(budget)
+    try:
+        yield budget
+    finally:
+        try:
+            _active.reset(token)
+        except ValueError:
+            # Closed from another context (an abandoned stream); nothing to restore.
+            pass
+
+
+def request_budget():
+    """Context manager for one pipeline request's budget."""
+    limits = dict(REQUEST_BUDGET, **_overrides().get("request", {}))
+    return _scope(Budget("request", limits))
+
+
+def agent_budget(name):
+    """Context manager for one agent call's budget, nested in the active request."""
+    return _scope(Budget(name, budget_for(name), parent=_active.get()))
+
+
+def take_search():
+    budget = _active.get()
+    if budget is not None:
+        budget.take_search()
+
+
+class BudgetHandler(BaseCallbackHandler):
+    """Stops model calls once the active budget is out of time or tokens.
+
+    Tokens are charged after each call and checked before the next one, so
+    a response that has already been paid for is never thrown away.
+    """
+
+    raise_error = True
+
+    def _check(self):
+        budget = _active.get()
+        if budget is not None:
+            budget.check()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._check()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._check()
+
+    def on_llm_end(self, response, **kwargs):
+        budget = _active.get()
+        if budget is None:
+            return
+        tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                tokens += usage.get("total_tokens", 0)
+        budget.charge(llm_calls=1, tokens=tokens)
+
+
+guard = BudgetHandler()
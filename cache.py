@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import threading
+import time
+
+from sites import site_key
+
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# How long a specialist answer stays fresh. Hours and prices change often;
+# history and culture hardly ever do.
+CATEGORY_TTLS = {
+    "Visiting Hours & Timing": 6 * HOUR,
+    "Tickets & Pricing": 1 * DAY,
+    "Visitor Tips & Rules": 7 * DAY,
+    "Facilities & Nearby Attractions": 7 * DAY,
+    "Custom Experience": 3 * DAY,
+    "Location & Accessibility": 30 * DAY,
+    "Comparison & Recommendations": 30 * DAY,
+    "General Information": 90 * DAY,
+    "Historical & Cultural Insights": 90 * DAY,
+    "Language & Culture": 90 * DAY,
+}
+DEFAULT_TTL = 1 * DAY
+
+# How long past its TTL an answer may still be served while a background
+# refresh replaces it (SERVE_STALE). Categories not listed are never served
+# stale: once expired, the user waits for fresh research.
+STALE_WINDOWS = {
+    "Visiting Hours & Timing": 1 * DAY,
+    "Tickets & Pricing": 3 * DAY,
+}
+
+
+class ResearchCache:
+    """SQLite cache of specialist output keyed on (category, site id).
+
+    Entries expire after their category's TTL, and the least recently used
+    rows are evicted once the table grows past `max_entries`. Expired rows
+    are kept for their category's stale window, so `entry` can still serve
+    them while they are refreshed.
+    """
+
+    def __init__(self, path=None, max_entries=None, ttls=None, stale_windows=None):
+        self.path = path or os.getenv("RESEARCH_CACHE_PATH", "research_cache.sqlite3")
+        self.max_entries = max_entries or int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "5000"))
+        self.ttls = dict(CATEGORY_TTLS, **(ttls or {}))
+        self.stale_windows = dict(STALE_WINDOWS, **(stale_windows or {}))
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS research (
+                   category TEXT NOT NULL,
+                   site TEXT NOT NULL,
+                   value TEXT NOT NULL,
+                   created_at REAL NOT NULL,
+                   accessed_at REAL NOT NULL,
+                   PRIMARY KEY (category, site)
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS research_lru ON research (accessed_at)")
+
+    def get(self, category, site):
+        """The fresh cached answer, or None."""
+        entry = self.entry(category, site)
+        return None if entry is None else entry[0]
+
+    def entry(self, category, site, allow_stale=False):
+        """(value, created_at, stale) for a cached answer, or None.
+
+        With `allow_stale`, an answer past its TTL but within its category's
+        stale window is returned with stale=True. Answers past both are
+        deleted.
+        """
+        key = site_key(site)
+        if not key:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM research WHERE category = ? AND site = ?",
+                (category, key),
+            ).fetchone()
+            ttl = self.ttls.get(category, DEFAULT_TTL)
+            stale = row is not None and now - row[1] > ttl
+            if stale and now - row[1] > ttl + self.stale_windows.get(category, 0):
+                self._conn.execute(
+                    "DELETE FROM research WHERE category = ? AND site = ?", (category, key)
+                )
+                row = None
+            if row is None or (stale and not allow_stale):
+                self._misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE research SET accessed_at = ? WHERE category = ? AND site = ?",
+                (now, category, key),
+            )
+            if stale:
+                self._stale_hits += 1
+            else:
+                self._hits += 1
+            return row[0], row[1], stale
+
+    def put(self, category, site, value, created_at=None):
+        """Cache `value`, researched at `created_at` (default now)."""
+        key = site_key(site)
+        if not key:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO research VALUES (?, ?, ?, ?, ?)",
+                (category, key, value, created_at or now, now),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM research").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    """DELETE FROM research WHERE rowid IN (
+                           SELECT rowid FROM research ORDER BY accessed_at LIMIT ?
+                       )""",
+                    (count - self.max_entries,),
+                )
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM research").fetchone()
+            total = self._hits + self._stale_hits + self._misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "stale_hits": self._stale_hits,
+                "misses": self._misses,
+                "hit_rate": round((self._hits + self._stale_hits) / total, 3) if total else 0.0,
+            }
@@ -0,0 +1,303 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from sites import get_site_index
+
+
+# Labeled queries the n-gram model is trained on. The first ten mirror the
+# example queries offered in the sidebar of main.py.
+SEED_QUERIES = [
+    ("Tell me about the Taj Mahal.", "General Information"),
+    ("Where is Angkor Wat located?", "Location & Accessibility"),
+    ("What are the opening hours of the Louvre?", "Visiting Hours & Timing"),
+    ("How much is the entry fee for the Acropolis?", "Tickets & Pricing"),
+    ("Who built the Pyramids of Giza and why?", "Historical & Cultural Insights"),
+    ("What should I wear when visiting the Golden Temple?", "Visitor Tips & Rules"),
+    ("What can I see near the Eiffel Tower?", "Facilities & Nearby Attractions"),
+    ("Can I get a private tour of the Red Fort?", "Custom Experience"),
+    ("Which is better to visit—Hampi or Badami?", "Comparison & Recommendations"),
+    ("What language is spoken at Hampi?", "Language & Culture"),
+
+    ("Give me an overview of Machu Picchu.", "General Information"),
+    ("What is the Colosseum?", "General Information"),
+    ("Is Petra a UNESCO World Heritage site?", "General Information"),
+    ("Some information about Stonehenge please", "General Information"),
+
+    ("How do I get to Machu Picchu from Cusco?", "Location & Accessibility"),
+    ("Is the Alhambra wheelchair accessible?", "Location & Accessibility"),
+    ("Nearest airport to Petra", "Location & Accessibility"),
+    ("Which train station is closest to the Colosseum?", "Location & Accessibility"),
+    ("How far is the Taj Mahal from Delhi?", "Location & Accessibility"),
+
+    ("When does the Colosseum open?", "Visiting Hours & Timing"),
+    ("Is the Taj Mahal closed on Fridays?", "Visiting Hours & Timing"),
+    ("What time is last entry at the Alhambra?", "Visiting Hours & Timing"),
+    ("How long does a visit to Angkor Wat take?", "Visiting Hours & Timing"),
+    ("What are the visiting hours of the Red Fort?", "Visiting Hours & Timing"),
+
+    ("How much do tickets to the Colosseum cost?", "Tickets & Pricing"),
+    ("Ticket price for the Taj Mahal for foreigners", "Tickets & Pricing"),
+    ("Can I book Louvre tickets online?", "Tickets & Pricing"),
+    ("Is there a student discount at the Alhambra?", "Tickets & Pricing"),
+    ("Is entry to the Golden Temple free?", "Tickets & Pricing"),
+
+    ("What is the history of the Great Wall of China?", "Historical & Cultural Insights"),
+    ("Why was the Taj Mahal built?", "Historical & Cultural Insights"),
+    ("Which dynasty built Angkor Wat?", "Historical & Cultural Insights"),
+    ("What is the cultural significance of Stonehenge?", "Historical & Cultural Insights"),
+    ("Legends and myths about Machu Picchu", "Historical & Cultural Insights"),
+
+    ("Is photography allowed inside the Vatican Museums?", "Visitor Tips & Rules"),
+    ("What is the dress code for the Blue Mosque?", "Visitor Tips & Rules"),
+    ("Any tips for visiting the Great Wall?", "Visitor Tips & Rules"),
+    ("What items are prohibited at the Taj Mahal?", "Visitor Tips & Rules"),
+    ("What is the best time to visit Petra to avoid crowds?", "Visitor Tips & Rules"),
+
+    ("Are there hotels near Angkor Wat?", "Facilities & Nearby Attractions"),
+    ("Is there parking at the Red Fort?", "Facilities & Nearby Attractions"),
+    ("Are there restrooms and food courts at the Colosseum?", "Facilities & Nearby Attractions"),
+    ("What attractions are close to the Acropolis?", "Facilities & Nearby Attractions"),
+    ("Where can I eat near the Louvre?", "Facilities & Nearby Attractions"),
+
+    ("Are there sunrise tours of Angkor Wat?", "Custom Experience"),
+    ("Plan a photography tour of Petra for me", "Custom Experience"),
+    ("Are there guided tours of the Alhambra for families?", "Custom Experience"),
+    ("What festivals or special events happen at Stonehenge?", "Custom Experience"),
+    ("Can I book a night experience at the Taj Mahal?", "Custom Experience"),
+
+    ("Compare the Colosseum and the Roman Forum", "Comparison & Recommendations"),
+    ("Taj Mahal vs Humayun's Tomb", "Comparison & Recommendations"),
+    ("What other sites are similar to Angkor Wat?", "Comparison & Recommendations"),
+    ("Recommend heritage sites to visit near Petra", "Comparison & Recommendations"),
+    ("Should I visit Machu Picchu or Chichen Itza?", "Comparison & Recommendations"),
+
+    ("What languages do people speak near Machu Picchu?", "Language & Culture"),
+    ("What local customs should I know at the Golden Temple?", "Language & Culture"),
+    ("Do guides at the Louvre speak English?", "Language & Culture"),
+    ("What traditions are associated with Angkor Wat?", "Language & Culture"),
+    ("What is the local dialect around Hampi?", "Language & Culture"),
+]
+
+# Strong lexical cues per category; a match is added on top of the n-gram similarity.
+KEYWORD_RULES = {
+    "General Information": r"\b(tell me about|overview|what is|information about|unesco)\b",
+    "Location & Accessibility": r"\b(where is|located|location|get to|reach|how far|airport|train|station|wheelchair|accessib\w*|directions?)\b",
+    "Visiting Hours & Timing": r"\b(hours?|open(ing)?|clos(e|ed|ing)|timings?|what time|when does|last entry|how long)\b",
+    "Tickets & Pricing": r"\b(tickets?|price|pricing|cost|fees?|how much|entry fee|discount|free entry|book\w* tickets?)\b",
+    "Historical & Cultural Insights": r"\b(history|historical|who built|why was|built|dynasty|empire|significance|legends?|myths?)\b",
+    "Visitor Tips & Rules": r"\b(wear|dress code|rules?|allowed|prohibited|tips|photography allowed|avoid crowds|best time)\b",
+    "Facilities & Nearby Attractions": r"\b(near(by)?|close to|hotels?|parking|restrooms?|food|eat|facilities|attractions?)\b",
+    "Custom Experience": r"\b(private tour|guided tours?|sunrise|sunset|experience|plan a|festivals?|special events?)\b",
+    "Comparison & Recommendations": r"\b(better|vs\.?|versus|compare|comparison|similar|recommend\w*)\b",
+    "Language & Culture": r"\b(language|languages|spoken|speak|dialects?|customs|traditions?|etiquette)\b",
+}
+RULE_WEIGHT = 0.35
+
+# Multi-facet questions ("opening hours and ticket price of the Louvre") are
+# split only when joined by a conjunction and each facet has its own keyword hit.
+MAX_FACETS = 3
+FACET_RATIO = 0.6
+_CONJUNCTION = re.compile(r"\b(and|plus|as well as|also)\b|[,&]", re.IGNORECASE)
+
+INTENTS = {
+    "General Information": "learn general facts",
+    "Location & Accessibility": "find out where it is and how to get there",
+    "Visiting Hours & Timing": "find the visiting hours",
+    "Tickets & Pricing": "find the ticket prices",
+    "Historical & Cultural Insights": "learn the history and cultural background",
+    "Visitor Tips & Rules": "learn the visitor rules and tips",
+    "Facilities & Nearby Attractions": "find facilities and nearby attractions",
+    "Custom Experience": "plan a custom experience",
+    "Comparison & Recommendations": "compare it with or find similar sites",
+    "Language & Culture": "learn the local language and culture",
+}
+
+_QUESTION_TYPES = [
+    ("comparison", r"\b(better|vs\.?|versus|compare|comparison)\b"),
+    ("recommendation", r"\b(recommend\w*|suggest\w*|similar|should i visit)\b"),
+    ("instruction", r"\b(how do i|how to|should i|can i|plan)\b"),
+    ("opinion", r"\b(worth|best|favourite|favorite)\b"),
+]
+
+# Capitalised runs such as "Taj Mahal", "Pyramids of Giza" or "Humayun's Tomb".
+_SITE_RE = re.compile(
+    r"\b(?:[A-Z][\w'’]+)(?:\s+(?:of|de|del|la|and|&)?\s*[A-Z][\w'’]+)*"
+)
+_LEADING_WORDS = {
+    "what", "where", "when", "who", "why", "how", "which", "is", "are", "can",
+    "tell", "give", "do", "does", "should", "any", "some", "plan", "recommend",
+    "compare", "ticket", "nearest", "legends", "i", "the",
+    # "From Delhi, ..." or "In August, ..." open a sentence without naming a site.
+    "from", "in", "on", "at", "to", "near", "during", "for", "after", "before",
+    "between", "around", "via", "by", "if", "my", "our",
+    "january", "february", "march", "april", "may", "june", "july", "august",
+    "september", "october", "november", "december",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "mondays", "tuesdays", "wednesdays", "thursdays", "fridays", "saturdays", "sundays",
+}
+
+
+def site_candidates(query, known=None):
+    """Possible site names in `query`, most likely first.
+
+    Candidates are the capitalised runs in `query` without their leading
+    question words, prepositions, months and weekdays. When `known(name)`
+    recognises any of them (or the tail of one, as "Taj Mahal" in "Visit
+    Taj Mahal"), only the recognised names are returned.
+    """
+    candidates = []
+    for match in _SITE_RE.finditer(query):
+        words = match.group(0).split()
+        while words and words[0].lower() in _LEADING_WORDS:
+            words.pop(0)
+        if words and " ".join(words) not in [name for _, name in candidates]:
+            # A lone capitalised first word is usually just the start of the sentence.
+            sentence_start = match.start() == 0 and len(words) == 1
+            candidates.append((sentence_start, " ".join(words)))
+    candidates = [name for _, name in sorted(candidates, key=lambda candidate: candidate[0])]
+    if known is None:
+        return candidates
+    recognised = []
+    for name in candidates:
+        words = name.split()
+        tails = (" ".join(words[i:]) for i in range(len(words)))
+        tail = next((tail for tail in tails if known(tail)), None)
+        if tail is not None and tail not in recognised:
+            recognised.append(tail)
+    return recognised or candidates
+
+
+def extract_site(query, known=None):
+    """Best-effort site name from the capitalised words in `query`, or 'Unknown'."""
+    candidates = site_candidates(query, known)
+    return candidates[0] if candidates else "Unknown"
+
+
+def _features(text):
+    grams = Counter()
+    for word in re.findall(r"[a-z']+", text.lower()):
+        grams["w:" + word] += 1
+        padded = f" {word} "
+        for n in (3, 4):
+            for i in range(len(padded) - n + 1):
+                grams[padded[i:i + n]] += 1
+    return grams
+
+
+class IntentClassifier:
+    """Local fast path for CategorizerAgent: keyword rules plus a char n-gram TF-IDF model.
+
+    `classify` returns the categorizer's dict when the prediction is confident
+    enough, or None to tell the caller to ask the LLM instead. Site names the
+    SiteIndex (`sites`, the process-wide one by default) already knows are
+    preferred over other capitalised words; a query that still names more
+    than one candidate has zero confidence, since picking the wrong one would
+    file its research under the wrong site.
+    """
+
+    def __init__(self, examples=SEED_QUERIES, threshold=None, sites=None):
+        if threshold is None:
+            threshold = float(os.getenv("CLASSIFIER_THRESHOLD", "0.3"))
+        self.threshold = threshold
+        self.sites = sites
+        self._rules = {cat: re.compile(rx, re.IGNORECASE) for cat, rx in KEYWORD_RULES.items()}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._fallbacks = 0
+        self._seconds = 0.0
+        self._fit(examples)
+
+    def _mask_site(self, query, site):
+        return query.replace(site, " ") if site != "Unknown" else query
+
+    def _fit(self, examples):
+        docs = [(_features(self._mask_site(q, extract_site(q))), cat) for q, cat in examples]
+        df = Counter()
+        for grams, _ in docs:
+            df.update(grams.keys())
+        self._idf = {g: math.log((1 + len(docs)) / (1 + n)) + 1 for g, n in df.items()}
+        centroids = defaultdict(Counter)
+        for grams, cat in docs:
+            for g, w in self._weigh(grams).items():
+                centroids[cat][g] += w
+        self._centroids = {cat: self._normalize(vec) for cat, vec in centroids.items()}
+
+    def _weigh(self, grams):
+        return self._normalize({g: tf * self._idf[g] for g, tf in grams.items() if g in self._idf})
+
+    @staticmethod
+    def _normalize(vec):
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        return {g: w / norm for g, w in vec.items()}
+
+    def predict(self, query):
+        """Return (categorizer dict, confidence) for `query`."""
+        candidates = site_candidates(query, (self.sites or get_site_index()).knows)
+        site = candidates[0] if candidates else "Unknown"
+        vec = self._weigh(_features(self._mask_site(query, site)))
+        scores = {}
+        matched = set()
+        for cat, centroid in self._centroids.items():
+            score = sum(w * centroid.get(g, 0.0) for g, w in vec.items())
+            if self._rules[cat].search(query):
+                score += RULE_WEIGHT
+                matched.add(cat)
+            scores[cat] = score
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        category, best = ranked[0]
+        categories = [category]
+        if _CONJUNCTION.search(query):
+            categories += [
+                cat for cat, score in ranked[1:]
+                if cat in matched and cat != "General Information" and score >= FACET_RATIO * best
+            ]
+            categories = categories[:MAX_FACETS]
+        # Confidence is the margin of the weakest chosen facet over the best unchosen one.
+        weakest = scores[categories[-1]]
+        runner_up = next(score for cat, score in ranked if cat not in categories)
+        confidence = (weakest - runner_up) / weakest if weakest > 0 and len(candidates) <= 1 else 0.0
+        result = {
+            "category": category,
+            "categories": categories,
+            "site": site,
+            "intent": f"{INTENTS[category]} about {site}" if site != "Unknown" else INTENTS[category],
+            "question_type": self._question_type(query),
+        }
+        return result, confidence
+
+    @staticmethod
+    def _question_type(query):
+        for name, pattern in _QUESTION_TYPES:
+            if re.search(pattern, query, re.IGNORECASE):
+                return name
+        return "fact"
+
+    def classify(self, query):
+        start = time.perf_counter()
+        result, confidence = self.predict(query)
+        elapsed = time.perf_counter() - start
+        # Without a site the LLM is better placed to spot lower-case or partial names.
+        hit = confidence >= self.threshold and result["site"] != "Unknown"
+        with self._lock:
+            self._seconds += elapsed
+            if hit:
+                self._hits += 1
+            else:
+                self._fallbacks += 1
+        return result if hit else None
+
+    def stats(self):
+        with self._lock:
+            total = self._hits + self._fallbacks
+            return {
+                "threshold": self.threshold,
+                "requests": total,
+                "fast_path_hits": self._hits,
+                "llm_fallbacks": self._fallbacks,
+                "hit_rate": round(self._hits / total, 3) if total else 0.0,
+                "avg_latency_ms": round(1000 * self._seconds / total, 3) if total else 0.0,
+            }
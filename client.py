@@ -0,0 +1,27 @@
+import json
+import os
+
+import requests
+
+
+API_URL = os.getenv("HERITAGE_API_URL", "").rstrip("/")
+
+
+class Busy(Exception):
+    """The API answered 429; the caller should retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def ask_stream(topic, api_url=None, timeout=300):
+    """Same events as pipeline.ask_stream, read from the API's /ask/stream."""
+    url = (api_url or API_URL) + "/ask/stream"
+    with requests.post(url, json={"query": topic}, stream=True, timeout=timeout) as response:
+        if response.status_code == 429:
+            raise Busy(response.headers.get("Retry-After", "5"))
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
@@ -0,0 +1,192 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from cache import CATEGORY_TTLS, DAY, DEFAULT_TTL
+from parsing import SCHEMAS
+from sites import site_key
+
+
+# Fields that hardly ever change, whatever their category's TTL says.
+STABLE_FIELDS = {
+    "site",
+    "location.country",
+    "location.city_or_region",
+    "location.state_or_region",
+    "location.nearest_major_city",
+    "location.geo_coordinates.latitude",
+    "location.geo_coordinates.longitude",
+    "established_year",
+    "founded_by",
+    "unesco_status.is_unesco_site",
+    "unesco_status.designation_year",
+    "historical_background.founded_in",
+    "historical_background.built_by",
+    "historical_background.construction_period",
+    "historical_background.unesco_status.designated",
+    "historical_background.unesco_status.year",
+    "language.primary",
+}
+STABLE_TTL = 365 * DAY
+
+
+def leaf_paths(schema, prefix=""):
+    """Dotted paths of a schema's leaves. Lists are stored whole, so they are leaves too."""
+    if not isinstance(schema, dict):
+        return [prefix]
+    paths = []
+    for key, sub in schema.items():
+        paths.extend(leaf_paths(sub, f"{prefix}.{key}" if prefix else key))
+    return paths
+
+
+def flatten(data, schema):
+    """{path: value} for every leaf of `schema` that `data` actually fills in."""
+    values = {}
+    for path in leaf_paths(schema):
+        value = data
+        for key in path.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        if value not in (None, "", []):
+            values[path] = value
+    return values
+
+
+def unflatten(values):
+    nested = {}
+    for path, value in values.items():
+        *parents, leaf = path.split(".")
+        node = nested
+        for key in parents:
+            node = node.setdefault(key, {})
+        node[leaf] = value
+    return nested
+
+
+def fill(data, known):
+    """`data` with the gaps it left filled from `known` ({path: value})."""
+    for path, value in known.items():
+        *parents, leaf = path.split(".")
+        node = data
+        for key in parents:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        if node.get(leaf) in (None, "", []):
+            node[leaf] = value
+    return data
+
+
+class FactStore:
+    """SQLite store of validated specialist answers, kept field by field.
+
+    Specialists read the fresh fields for their category before running and
+    only research what is missing or stale. Stable fields (founding year,
+    country, UNESCO status...) live for a year; the rest follow the category
+    TTLs of the research cache. Rows are keyed on the site id, so "Taj Mahal"
+    and "the Taj" share the same facts. The site name inside an answer is the
+    model's and is never made an alias: the prompt schemas show a placeholder
+    there, and a comparison may name the other site.
+    """
+
+    def __init__(self, path=None, ttls=None, schemas=SCHEMAS):
+        self.path = path or os.getenv("FACT_STORE_PATH", "facts.sqlite3")
+        self.ttls = dict(CATEGORY_TTLS, **(ttls or {}))
+        self.schemas = schemas
+        self._lock = threading.Lock()
+        self._complete = 0
+        self._partial = 0
+        self._empty = 0
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS facts (
+                   site TEXT NOT NULL,
+                   category TEXT NOT NULL,
+                   field TEXT NOT NULL,
+                   value TEXT NOT NULL,
+                   updated_at REAL NOT NULL,
+                   PRIMARY KEY (site, category, field)
+               )"""
+        )
+
+    def _ttl(self, category, field):
+        return STABLE_TTL if field in STABLE_FIELDS else self.ttls.get(category, DEFAULT_TTL)
+
+    def lookup(self, category, site):
+        """Return ({path: value} of fresh facts, [paths still missing or stale], as_of).
+
+        `as_of` is when the oldest fresh fact that can change was researched,
+        or None when nothing is known.
+        """
+        schema = self.schemas.get(category)
+        if schema is None:
+            return {}, [], None
+        fields = leaf_paths(schema)
+        key = site_key(site)
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT field, value, updated_at FROM facts WHERE site = ? AND category = ?",
+                (key, category),
+            ).fetchall() if key else []
+            fresh = {
+                field: (value, updated_at)
+                for field, value, updated_at in rows
+                if now - updated_at <= self._ttl(category, field)
+            }
+            # Schema order, so answers rebuilt from facts read like the specialist's.
+            known = {field: json.loads(fresh[field][0]) for field in fields if field in fresh}
+            # Stable fields are old by design; the date that matters is the oldest of the rest.
+            researched = [fresh[field][1] for field in known if field not in STABLE_FIELDS]
+            as_of = min(researched or [fresh[field][1] for field in known], default=None)
+            missing = [field for field in fields if field not in fresh]
+            if not known:
+                self._empty += 1
+            elif missing:
+                self._partial += 1
+            else:
+                self._complete += 1
+        return known, missing, as_of
+
+    def record(self, category, site, data):
+        """Store every field `data` (a schema-shaped answer) fills in for `site`."""
+        schema = self.schemas.get(category)
+        if schema is None or not isinstance(data, dict):
+            return
+        key = site_key(site)
+        if not key:
+            return
+        values = flatten(data, schema)
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO facts VALUES (?, ?, ?, ?, ?)",
+                [(key, category, field, json.dumps(value, ensure_ascii=False), now)
+                 for field, value in values.items()],
+            )
+
+    def stats(self):
+        with self._lock:
+            (sites,) = self._conn.execute("SELECT COUNT(DISTINCT site) FROM facts").fetchone()
+            (facts,) = self._conn.execute("SELECT COUNT(*) FROM facts").fetchone()
+            return {
+                "sites": sites,
+                "facts": facts,
+                "complete": self._complete,
+                "partial": self._partial,
+                "empty": self._empty,
+            }
+
+
+def known_facts_prompt(known, missing):
+    """Prompt section telling a specialist what it already knows and what to look up."""
+    if not known:
+        return ""
+    return (
+        "\n\n# KNOWN FACTS (already verified; copy them into your answer unchanged, do not search for them):\n"
+        f"{json.dumps(unflatten(known), ensure_ascii=False)}\n"
+        f"Only search for the fields that are still missing: {', '.join(missing)}\n"
+    )
@@ -1,18 +1,37 @@
 # main.py
 
+import calendar
+import itertools
+import os
+import time
 import streamlit as st
 from agents import (
-    CategorizerAgent, GeneralAgent, LocationAgent,
-    TimeAgent, TicketAgent, CultureInsightsAgent,
-    TipsAgent, FacilitiesAgent, ExperienceAgent,
-    RecommendationAgent, LanguageAgent, WriterAgent
+    CategorizerAgent,
+    get_agent, get_fact_store, get_question_cache, get_registry, get_research_cache,
+    get_search_client, get_site_index
 )
+import client
+import pipeline
+from parsing import output_parser
+from prompts import prompt_usage
+from routing import model_usage
+import metrics
 from dotenv import load_dotenv
 load_dotenv()
 
 st.set_page_config(page_title="Heritage Site Explorer", layout="wide")
 
 
+@st.cache_resource
+def start_metrics_server():
+    return metrics.serve()
+
+
+# Prometheus text at http://<host>:$METRICS_PORT/metrics
+if os.getenv("METRICS_PORT"):
+    start_metrics_server()
+
+
 
 st.markdown("""
     <style>
@@ -168,57 +187,105 @@ topic = st.text_input("Ask something about a heritage site:", value=default_text
 
 # topic = st.text_input("Enter a heritage site name or query:")
 
-if st.button("Ask our AI Tour Guide"):
-    agent = CategorizerAgent()
-    response = agent.categorize_topic(topic)
-    category = response["category"]
-    # st.json(category)
-    
-    if category == "General Information":
-        generalizer = GeneralAgent()
-        data = generalizer.general_topic(topic)
-        
-    elif category == "Location & Accessibility":
-        generalizer = LocationAgent()
-        data = generalizer.locate(topic)
-        
-    elif category == "Location & Accessibility":
-        generalizer = LocationAgent()
-        data = generalizer.locate(topic)
-    
-    elif category == "Visiting Hours & Timing":
-        generalizer = TimeAgent()
-        data = generalizer.time(topic)
-        
-    elif category == "Tickets & Pricing":
-        generalizer = TicketAgent()
-        data = generalizer.ticket(topic)
-        
-    elif category == "Historical & Cultural Insights":
-        generalizer = CultureInsightsAgent()
-        data = generalizer.culture(topic)
-    
-    elif category == "Visitor Tips & Rules":
-        generalizer = TipsAgent()
-        data = generalizer.tips(topic)
-    
-    elif category == "Facilities & Nearby Attractions":
-        generalizer = FacilitiesAgent() 
-        data = generalizer.facility(topic)
-        
-    elif category == "Custom Experience":
-        generalizer = ExperienceAgent()
-        data = generalizer.experience(topic)
-        
-    elif category == "Comparison & Recommendations":
-        generalizer = RecommendationAgent()
-        data = generalizer.recommend(topic)
-        
-    elif category == "Language & Culture":
-        generalizer = LanguageAgent()
-        data = generalizer.language(topic)
+STAGE_LABELS = {
+    "categorizing": "Understanding your question...",
+    "researching": "Researching the site...",
+    "writing": "Writing your answer...",
+    "cached": "Found an answer to the same question...",
+}
 
-    writer = WriterAgent()
-    article = writer.write_article(data)
-    
-    st.markdown(article)
\ No newline at end of file
+
+def ask_stream(topic):
+    # With HERITAGE_API_URL set the page is a thin client of api.py; otherwise it runs the pipeline in-process.
+    if client.API_URL:
+        return client.ask_stream(topic)
+    return pipeline.ask_stream(topic)
+
+
+def data_age(as_of):
+    """'3 hours ago' for an "as_of" UTC time from the pipeline."""
+    seconds = time.time() - calendar.timegm(time.strptime(as_of, "%Y-%m-%dT%H:%M:%SZ"))
+    if seconds < 90:
+        return "just now"
+    if seconds < 90 * 60:
+        return f"{round(seconds / 60)} minutes ago"
+    if seconds < 36 * 3600:
+        return f"{round(seconds / 3600)} hours ago"
+    return f"{round(seconds / 86400)} days ago"
+
+
+def article_tokens(events, done):
+    for event in events:
+        if event["event"] == "token":
+            yield event["text"]
+        elif event["event"] == "done":
+            done.update(event)
+
+
+if st.button("Ask our AI Tour Guide"):
+    events = ask_stream(topic)
+    with st.status(STAGE_LABELS["categorizing"]) as status:
+        try:
+            event = next(events)
+        except client.Busy as exc:
+            status.update(label="Busy", state="error")
+            st.warning(f"The tour guide is busy right now, please try again in {exc.retry_after} seconds.")
+            st.stop()
+        for event in itertools.chain([event], events):
+            if event["event"] == "error":
+                status.update(label="Something went wrong", state="error")
+                st.error(event["detail"])
+                st.stop()
+            status.update(label=STAGE_LABELS[event["stage"]])
+            if event["stage"] == "researching":
+                status.write(f"Topics: {', '.join(event['categories'])} — site: {event['site']}")
+            if event["stage"] in ("writing", "cached"):
+                break
+        status.update(label="Research done", state="complete")
+    done = {}
+    st.write_stream(article_tokens(events, done))
+    timings = done.get("timings", {})
+    match = done.get("result", {}).get("semantic_match")
+    if match:
+        st.caption(f"Answered earlier as “{match['query']}”")
+    researched = done.get("result", {}).get("as_of")
+    if researched:
+        st.caption("Data as of " + "; ".join(f"{category}: {data_age(when)}" for category, when in researched.items()))
+    if "first_token_s" in timings:
+        st.caption(f"First words after {timings['first_token_s']}s, done in {timings['total_s']}s")
+    exceeded = done.get("result", {}).get("budget", {}).get("exceeded")
+    if exceeded:
+        st.info("This answer may be incomplete: " + "; ".join(f"{e['scope']} hit {e['limit']}" for e in exceeded))
+
+# Pipeline stats only mean something when it runs in this process.
+if not client.API_URL:
+    with st.sidebar.expander("Agent registry"):
+        st.json(get_registry().stats())
+
+    with st.sidebar.expander("Research cache"):
+        st.json(get_research_cache().stats())
+
+    with st.sidebar.expander("Question cache"):
+        st.json(get_question_cache().stats())
+        st.json(get_question_cache().audits())
+
+    with st.sidebar.expander("Fact store"):
+        st.json(get_fact_store().stats())
+
+    with st.sidebar.expander("Site index"):
+        st.json(get_site_index().stats())
+
+    with st.sidebar.expander("Search cache"):
+        st.json(get_search_client().stats())
+
+    with st.sidebar.expander("Output parsing"):
+        st.json(output_parser.stats())
+
+    with st.sidebar.expander("Prompt tokens"):
+        st.json(prompt_usage.stats())
+
+    with st.sidebar.expander("Model tiers"):
+        st.json(model_usage.stats())
+
+    with st.sidebar.expander("Intent classifier"):
+        st.json(get_agent(CategorizerAgent).classifier.stats())
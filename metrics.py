@@ -0,0 +1,296 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+LATENCY_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, float("inf"))
+
+_log = logging.getLogger("heritage.metrics")
+if os.getenv("METRICS_LOG", "on") != "off" and not _log.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _log.addHandler(_handler)
+    _log.setLevel(logging.INFO)
+    _log.propagate = False
+
+
+class Trace:
+    """What happened during one agent call: model calls, tool calls, tokens and cache hits."""
+
+    def __init__(self, stage, agent):
+        self.stage = stage
+        self.agent = agent
+        self.llm_calls = 0
+        self.tool_calls = Counter()
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_hits = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, wall, error=None):
+        return {
+            "ts": round(time.time(), 3),
+            "stage": self.stage,
+            "agent": self.agent,
+            "wall_s": round(wall, 4),
+            "llm_calls": self.llm_calls,
+            # Each ReAct step is one model call, so for agent-based stages they match.
+            "react_iterations": self.llm_calls,
+            "tool_calls": dict(self.tool_calls),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_hits": dict(self.cache_hits),
+            "error": error,
+        }
+
+
+_current = contextvars.ContextVar("heritage_trace", default=None)
+
+
+class TraceHandler(BaseCallbackHandler):
+    """LangChain callback that credits model and tool events to the active Trace.
+
+    Attach it to every LLM and tool once; the trace it writes to comes from
+    the context of the call, so concurrent requests stay separate.
+    """
+
+    def _add(self, **kwargs):
+        current = _current.get()
+        if current is None:
+            return
+        with current._lock:
+            for name, amount in kwargs.items():
+                setattr(current, name, getattr(current, name) + amount)
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._add(llm_calls=1)
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._add(llm_calls=1)
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self._add(
+                    input_tokens=usage.get("input_tokens", 0),
+                    output_tokens=usage.get("output_tokens", 0),
+                )
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        current = _current.get()
+        if current is not None:
+            with current._lock:
+                current.tool_calls[(serialized or {}).get("name", "unknown")] += 1
+
+
+tracer = TraceHandler()
+
+
+class MetricsRegistry:
+    """Process-wide aggregates of every finished trace, rendered as Prometheus text."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = Counter()
+        self._errors = Counter()
+        self._seconds = defaultdict(float)
+        self._buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self._llm_calls = Counter()
+        self._tools = Counter()
+        self._tokens = Counter()
+        self._cache_hits = Counter()
+        self._collectors = {}
+
+    def observe(self, record):
+        key = (record["stage"], record["agent"])
+        with self._lock:
+            self._calls[key] += 1
+            if record["error"]:
+                self._errors[key] += 1
+            self._seconds[key] += record["wall_s"]
+            buckets = self._buckets[key]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if record["wall_s"] <= bound:
+                    buckets[i] += 1
+            self._llm_calls[record["agent"]] += record["llm_calls"]
+            for tool, count in record["tool_calls"].items():
+                self._tools[(record["agent"], tool)] += count
+            self._tokens[(record["agent"], "input")] += record["input_tokens"]
+            self._tokens[(record["agent"], "output")] += record["output_tokens"]
+            for cache, count in record["cache_hits"].items():
+                self._cache_hits[cache] += count
+
+    def observe_cache_hit(self, cache):
+        with self._lock:
+            self._cache_hits[cache] += 1
+
+    def register_collector(self, name, collect):
+        """Export the numeric values of `collect()` (a stats dict) as gauges."""
+        self._collectors[name] = collect
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append("# TYPE heritage_stage_seconds histogram")
+            for (stage, agent), buckets in self._buckets.items():
+                labels = f'stage="{stage}",agent="{agent}"'
+                for bound, count in zip(LATENCY_BUCKETS, buckets):
+                    le = "+Inf" if bound == float("inf") else bound
+                    lines.append(f'heritage_stage_seconds_bucket{{{labels},le="{le}"}} {count}')
+                lines.append(f"heritage_stage_seconds_sum{{{labels}}} {self._seconds[(stage, agent)]:.4f}")
+                lines.append(f"heritage_stage_seconds_count{{{labels}}} {self._calls[(stage, agent)]}")
+            lines.append("# TYPE heritage_stage_errors_total counter")
+            for (stage, agent), count in self._errors.items():
+                lines.append(f'heritage_stage_errors_total{{stage="{stage}",agent="{agent}"}} {count}')
+            lines.append("# TYPE heritage_llm_calls_total counter")
+            for agent, count in self._llm_calls.items():
+                lines.append(f'heritage_llm_calls_total{{agent="{agent}"}} {count}')
+            lines.append("# TYPE heritage_tool_calls_total counter")
+            for (agent, tool), count in self._tools.items():
+                lines.append(f'heritage_tool_calls_total{{agent="{agent}",tool="{tool}"}} {count}')
+            lines.append("# TYPE heritage_tokens_total counter")
+            for (agent, kind), count in self._tokens.items():
+                lines.append(f'heritage_tokens_total{{agent="{agent}",kind="{kind}"}} {count}')
+            lines.append("# TYPE heritage_cache_hits_total counter")
+            for cache, count in self._cache_hits.items():
+                lines.append(f'heritage_cache_hits_total{{cache="{cache}"}} {count}')
+            collectors = list(self._collectors.items())
+        for name, collect in collectors:
+            for key, value in _flatten(collect()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"heritage_{name}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(stats, prefix=""):
+    for key, value in stats.items():
+        name = (prefix + "_" + str(key)) if prefix else str(key)
+        name = "".join(ch if ch.isalnum() else "_" for ch in name).lower()
+        if isinstance(value, dict):
+            yield from _flatten(value, name)
+        else:
+            yield name, value
+
+
+metrics = MetricsRegistry()
+
+
+def note(cache):
+    """Count a cache hit against the active trace, or straight into the totals outside one."""
+    current = _current.get()
+    if current is None:
+        metrics.observe_cache_hit(cache)
+        return
+    with current._lock:
+        current.cache_hits[cache] += 1
+
+
+class _Span:
+    def __init__(self, stage, agent):
+        self.trace = Trace(stage, agent)
+        self.start = time.perf_counter()
+        self.error = None
+        self.token = _current.set(self.trace)
+
+    def fail(self, exc):
+        self.error = repr(exc)
+
+    def finish(self):
+        try:
+            _current.reset(self.token)
+        except ValueError:
+            # A generator finalized from another context; the trace is still recorded.
+            pass
+        record = self.trace.record(time.perf_counter() - self.start, self.error)
+        metrics.observe(record)
+        _log.info(json.dumps(record))
+
+
+def traced(stage):
+    """Time an agent method as `stage` and log one JSON record per call.
+
+    Works on plain, async, generator and async generator methods; the agent
+    name is the class of `self`.
+    """
+    def decorate(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(self, *args, **kwargs):
+                span = _Span(stage, type(self).__name__)
+                try:
+                    async for item in fn(self, *args, **kwargs):
+                        yield item
+                except Exception as exc:
+                    span.fail(exc)
+                    raise
+                finally:
+                    span.finish()
+        elif inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(self, *args, **kwargs):
+                span = _Span(stage, type(self).__name__)
+                try:
+                    yield from fn(self, *args, **kwargs)
+                except Exception as exc:
+                    span.fail(exc)
+                    raise
+                finally:
+                    span.finish()
+        elif inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(self, *args, **kwargs):
+                span = _Span(stage, type(self).__name__)
+                try:
+                    return await fn(self, *args, **kwargs)
+                except Exception as exc:
+                    span.fail(exc)
+                    raise
+                finally:
+                    span.finish()
+        else:
+            @functools.wraps(fn)
+            def wrapper(self, *args, **kwargs):
+                span = _Span(stage, type(self).__name__)
+                try:
+                    return fn(self, *args, **kwargs)
+                except Exception as exc:
+                    span.fail(exc)
+                    raise
+                finally:
+                    span.finish()
+        return wrapper
+    return decorate
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=None):
+    """Serve GET /metrics on `port` (default METRICS_PORT) from a daemon thread."""
+    port = int(port or os.getenv("METRICS_PORT", "9464"))
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
@@ -0,0 +1,343 @@
+import json
+import re
+import threading
+from collections import defaultdict
+
+
+# Expected shape of each agent's JSON, mirroring the OUTPUT FORMAT block of its
+# prompt. str/bool are leaf types, [x] is a list of x and dicts nest.
+SCHEMAS = {
+    "Categorizer": {
+        "category": str,
+        "categories": [str],
+        "site": str,
+        "intent": str,
+        "question_type": str,
+    },
+    "Planner": {
+        "category": str,
+        "categories": [str],
+        "site": str,
+        "intent": str,
+        "question_type": str,
+        "searches": [{"category": str, "query": str}],
+    },
+    "General Information": {
+        "site": str,
+        "location": {"country": str, "city_or_region": str},
+        "established_year": str,
+        "founded_by": str,
+        "historical_significance": str,
+        "cultural_importance": str,
+        "unesco_status": {"is_unesco_site": bool, "designation_year": str},
+        "official_website": str,
+    },
+    "Location & Accessibility": {
+        "site": str,
+        "location": {
+            "country": str,
+            "state_or_region": str,
+            "nearest_major_city": str,
+            "distance_from_city_km": str,
+            "geo_coordinates": {"latitude": str, "longitude": str},
+        },
+        "transportation": {
+            "available_modes": [str],
+            "nearest_airport": str,
+            "nearest_rail_station": str,
+            "common_routes": str,
+        },
+        "accessibility": {"wheelchair_accessible": bool, "senior_friendly": bool, "note": str},
+    },
+    "Visiting Hours & Timing": {
+        "site": str,
+        "timing": {
+            "time_zone": str,
+            "weekly_schedule": {
+                day: {"open": str, "close": str}
+                for day in ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+            },
+            "last_entry_time": str,
+            "closed_on": [str],
+            "special_events": {"night_entry_available": bool, "description": str},
+            "average_visit_duration": str,
+        },
+    },
+    "Tickets & Pricing": {
+        "site": str,
+        "ticketing": {
+            "currency": str,
+            "pricing": {
+                "local_adult": str, "local_child": str, "local_senior": str,
+                "foreign_adult": str, "foreign_child": str, "foreign_senior": str,
+            },
+            "ticket_types": [{"type": str, "price": str, "includes": str}],
+            "discounts": {"available_for": [str], "details": str},
+            "booking": {
+                "online_available": bool,
+                "official_website": str,
+                "third_party_sites": [str],
+                "on_site_purchase": bool,
+            },
+            "additional_charges": {"camera_fee": str, "parking_fee": str, "special_exhibit_fee": str},
+            "ticket_validity": str,
+        },
+    },
+    "Historical & Cultural Insights": {
+        "site": str,
+        "historical_background": {
+            "founded_in": str,
+            "built_by": str,
+            "construction_period": str,
+            "historical_events": [str],
+            "dynasties_or_empires": [str],
+            "unesco_status": {"designated": bool, "year": str, "reason": str},
+        },
+        "cultural_significance": {
+            "religious_importance": str,
+            "myths_and_legends": str,
+            "cultural_identity": str,
+            "ceremonial_use": str,
+            "architectural_features": [str],
+        },
+        "restoration_and_conservation": {
+            "major_restoration_years": [str],
+            "preservation_status": str,
+            "governing_body": str,
+        },
+    },
+    "Visitor Tips & Rules": {
+        "site": str,
+        "rules": {
+            "dress_code": str,
+            "photography_allowed": bool,
+            "videography_allowed": bool,
+            "prohibited_items": [str],
+            "conduct_guidelines": [str],
+        },
+        "tips": {
+            "best_visit_times": str,
+            "peak_hours_to_avoid": str,
+            "safety_advice": [str],
+            "family_friendly": bool,
+            "elderly_friendly": bool,
+            "solo_travel_tips": [str],
+        },
+        "notices": {"temporary_restrictions": str, "special_guidelines": str},
+    },
+    "Facilities & Nearby Attractions": {
+        "site": str,
+        "facilities": {
+            "restrooms": bool,
+            "drinking_water": bool,
+            "food_courts": bool,
+            "guided_tour_services": bool,
+            "wheelchair_access": bool,
+            "parking_available": bool,
+            "visitor_center": bool,
+        },
+        "nearby_accommodations": [{"name": str, "type": str, "distance_km": str, "contact": str}],
+        "emergency_services": {
+            "nearest_hospital": str,
+            "hospital_distance_km": str,
+            "police_station": str,
+            "police_distance_km": str,
+        },
+        "nearby_attractions": [{"name": str, "type": str, "distance_km": str}],
+    },
+    "Custom Experience": {
+        "site": str,
+        "custom_experiences": {
+            "guided_tours": [{
+                "name": str, "type": str, "duration_hours": str,
+                "available_languages": [str], "booking_link": str,
+            }],
+            "exclusive_experiences": [{"name": str, "description": str, "best_time": str}],
+            "tailored_activities": {"for_families": str, "for_solo_travelers": str, "for_seniors": str},
+            "seasonal_events": [{"event_name": str, "description": str, "season": str}],
+            "booking_channels": [str],
+        },
+    },
+    "Comparison & Recommendations": {
+        "site": str,
+        "comparisons": [{"compared_with": str, "similarities": [str], "differences": [str]}],
+        "recommendations": [{"site_name": str, "location": str, "reason_for_recommendation": str}],
+    },
+    "Language & Culture": {
+        "site": str,
+        "language": {"primary": str, "secondary": [str], "local_dialects": [str]},
+        "culture": {
+            "associated_traditions": [str],
+            "festivals_or_rituals": [str],
+            "religious_significance": str,
+            "visitor_etiquette": [str],
+        },
+    },
+}
+
+_TRUE = {"true", "yes", "y", "1"}
+_FALSE = {"false", "no", "n", "0"}
+_MISSING = {"", "unknown", "null", "none", "n/a"}
+
+
+class ParseError(ValueError):
+    pass
+
+
+class ParseResult:
+    """Outcome of parsing one model response against a schema.
+
+    `data` is the schema-shaped dict (missing fields set to None) or None
+    when nothing usable could be recovered; `raw` is the original text.
+    """
+
+    def __init__(self, data, raw, repaired=False, error=None):
+        self.data = data
+        self.raw = raw
+        self.repaired = repaired
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.data is not None
+
+    def to_json(self):
+        """Compact JSON for downstream stages, with empty and unknown fields dropped."""
+        return json.dumps(prune(self.data), ensure_ascii=False) if self.ok else self.raw
+
+
+def _first_object(text):
+    """Slice out the first balanced {...} in `text`, or up to the end if it never closes."""
+    start = text.find("{")
+    if start < 0:
+        raise ParseError("no JSON object in response")
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def _repair(candidate):
+    """One pass over the usual model mistakes: smart quotes, Python literals,
+    single quotes, trailing commas and unclosed brackets."""
+    fixed = candidate.translate({0x201C: '"', 0x201D: '"', 0x2018: "'", 0x2019: "'"})
+    if '"' not in fixed:
+        fixed = fixed.replace("'", '"')
+    fixed = re.sub(r"\bTrue\b", "true", fixed)
+    fixed = re.sub(r"\bFalse\b", "false", fixed)
+    fixed = re.sub(r"\bNone\b", "null", fixed)
+    fixed = re.sub(r",\s*([}\]])", r"\1", fixed)
+    if fixed.count('"') % 2:
+        fixed += '"'
+    closers = []
+    for ch in re.sub(r'"(?:\\.|[^"\\])*"', "", fixed):
+        if ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+        elif ch in "}]" and closers:
+            closers.pop()
+    fixed = re.sub(r",\s*$", "", fixed) + "".join(reversed(closers))
+    return fixed
+
+
+def extract_json(text):
+    """Return (object, repaired) for the first JSON object in `text`."""
+    candidate = _first_object(text or "")
+    try:
+        return json.loads(candidate), False
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_repair(candidate)), True
+    except json.JSONDecodeError as exc:
+        raise ParseError(f"invalid JSON after repair: {exc}") from exc
+
+
+def conform(value, schema):
+    """Coerce `value` into `schema`'s shape, keeping any extra keys the model added."""
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            return {key: conform(None, sub) for key, sub in schema.items()}
+        shaped = dict(value)
+        for key, sub in schema.items():
+            shaped[key] = conform(value.get(key), sub)
+        return shaped
+    if isinstance(schema, list):
+        if value is None:
+            return []
+        items = value if isinstance(value, list) else [value]
+        return [conform(item, schema[0]) for item in items]
+    if isinstance(value, str) and value.strip().lower() in _MISSING:
+        return None
+    if schema is bool:
+        if isinstance(value, bool) or value is None:
+            return value
+        text = str(value).strip().lower()
+        return True if text in _TRUE else False if text in _FALSE else None
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+
+
+def prune(value):
+    """Drop None values and containers left empty by them."""
+    if isinstance(value, dict):
+        pruned = {k: prune(v) for k, v in value.items()}
+        return {k: v for k, v in pruned.items() if v not in (None, {}, [])}
+    if isinstance(value, list):
+        return [v for v in map(prune, value) if v not in (None, {}, [])]
+    return value
+
+
+class OutputParser:
+    """Parses agent responses against SCHEMAS and tracks failure rates per agent."""
+
+    def __init__(self, schemas=SCHEMAS):
+        self.schemas = schemas
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {"parsed": 0, "repaired": 0, "failed": 0})
+
+    def parse(self, agent_name, schema_name, text):
+        schema = self.schemas[schema_name]
+        try:
+            obj, repaired = extract_json(text)
+            # Every schema has "site", so it says nothing about which one answered.
+            if not isinstance(obj, dict) or not (schema.keys() - {"site"}) & obj.keys():
+                raise ParseError("response does not match the expected object")
+            result = ParseResult(conform(obj, schema), text, repaired=repaired)
+        except ParseError as exc:
+            result = ParseResult(None, text, error=str(exc))
+        with self._lock:
+            counts = self._counts[agent_name]
+            counts["parsed"] += 1
+            if result.repaired:
+                counts["repaired"] += 1
+            if not result.ok:
+                counts["failed"] += 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: dict(counts, failure_rate=round(counts["failed"] / counts["parsed"], 3))
+                for name, counts in self._counts.items()
+            }
+
+
+output_parser = OutputParser()
@@ -0,0 +1,264 @@
+import asyncio
+import contextvars
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from budgets import request_budget
+from agents import (
+    CategorizerAgent, PlannerAgent, WriterAgent,
+    aplanned_research, aresearch, get_agent, get_question_cache, planned_research,
+    planned_searches, research, resolve_categories
+)
+
+
+# Specialists for multi-facet questions run side by side on this pool.
+_research_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RESEARCH_WORKERS", "8")),
+    thread_name_prefix="research",
+)
+
+# "agents": the categorizer, then a ReAct loop per specialist.
+# "fused": one call categorizes and plans the searches, the searches run in
+# parallel and one synthesis call per facet fills its schema.
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "agents")
+
+# "on": a near-duplicate of an answered question gets the stored answer
+# before any model call; "off" always runs the pipeline.
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "on")
+
+
+def recall(topic):
+    """The stored result of an earlier question close enough to `topic`, or None."""
+    if SEMANTIC_CACHE != "on":
+        return None
+    found = get_question_cache().get(topic)
+    if found is None:
+        return None
+    result, matched, similarity = found
+    return dict(result, topic=topic, semantic_match={"query": matched, "similarity": similarity})
+
+
+def remember(topic, response, result):
+    """Store a finished result for `recall`, unless it was cut short or miscategorized."""
+    if SEMANTIC_CACHE != "on" or "error" in response or result["budget"]["exceeded"]:
+        return
+    get_question_cache().put(topic, {key: value for key, value in result.items() if key != "budget"})
+
+
+def categorize(topic):
+    """The categorizer response for `topic`; in fused mode it carries the search plan too."""
+    if PIPELINE_MODE == "fused":
+        return get_agent(PlannerAgent).plan(topic)
+    return get_agent(CategorizerAgent).categorize_topic(topic)
+
+
+async def acategorize(topic):
+    if PIPELINE_MODE == "fused":
+        return await get_agent(PlannerAgent).aplan(topic)
+    return await get_agent(CategorizerAgent).acategorize_topic(topic)
+
+
+def research_facet(topic, response, category):
+    """Research one category of a categorized query the way PIPELINE_MODE says."""
+    site = response.get("site")
+    if PIPELINE_MODE == "fused":
+        return planned_research(topic, category, site, planned_searches(response, category))
+    return research(topic, category, site)
+
+
+async def aresearch_facet(topic, response, category):
+    site = response.get("site")
+    if PIPELINE_MODE == "fused":
+        return await aplanned_research(topic, category, site, planned_searches(response, category))
+    return await aresearch(topic, category, site)
+
+
+def merge_research(results):
+    """Combine per-category specialist output into one input for the writer.
+
+    A single facet is passed through untouched; several are merged into one
+    JSON object keyed by category.
+    """
+    if len(results) == 1:
+        return next(iter(results.values()))
+    merged = {}
+    for category, data in results.items():
+        try:
+            merged[category] = json.loads(data)
+        except (TypeError, ValueError):
+            merged[category] = data
+    return json.dumps(merged, ensure_ascii=False)
+
+
+def as_of(results):
+    """{category: when its research was done} for the facets that say, to show data age."""
+    times = {}
+    for category, data in results.items():
+        try:
+            researched = json.loads(data).get("as_of")
+        except (TypeError, ValueError, AttributeError):
+            continue
+        if researched:
+            times[category] = researched
+    return times
+
+
+def _research_all(topic, response, categories):
+    # Each facet runs in a copy of this context so it is charged to the request budget.
+    futures = {
+        c: _research_pool.submit(contextvars.copy_context().run, research_facet, topic, response, c)
+        for c in categories
+    }
+    return {c: f.result() for c, f in futures.items()}
+
+
+def ask(topic):
+    """Categorize `topic`, run the matching specialists and write the article.
+
+    The whole request runs within the request budget; "budget" in the
+    result reports its usage and any limit that was hit. A near-duplicate
+    of an earlier question returns that question's result, with
+    "semantic_match" naming it.
+    """
+    with request_budget() as budget:
+        cached = recall(topic)
+        if cached is not None:
+            return dict(cached, budget=budget.report())
+        response = categorize(topic)
+        categories = resolve_categories(response)
+        site = response.get("site")
+        results = _research_all(topic, response, categories)
+        data = merge_research(results)
+        article = get_agent(WriterAgent).write_article(data, ", ".join(categories), site)
+    result = {
+        "topic": topic, "category": categories[0], "categories": categories,
+        "site": site, "site_id": response["site_id"], "research": data, "article": article,
+        "as_of": as_of(results), "budget": budget.report(),
+    }
+    remember(topic, response, result)
+    return result
+
+
+async def aask(topic):
+    """Async counterpart of `ask`; awaits every model and agent call."""
+    with request_budget() as budget:
+        cached = recall(topic)
+        if cached is not None:
+            return dict(cached, budget=budget.report())
+        response = await acategorize(topic)
+        categories = resolve_categories(response)
+        site = response.get("site")
+        results = dict(zip(categories, await asyncio.gather(
+            *(aresearch_facet(topic, response, c) for c in categories)
+        )))
+        data = merge_research(results)
+        article = await get_agent(WriterAgent).awrite_article(data, ", ".join(categories), site)
+    result = {
+        "topic": topic, "category": categories[0], "categories": categories,
+        "site": site, "site_id": response["site_id"], "research": data, "article": article,
+        "as_of": as_of(results), "budget": budget.report(),
+    }
+    remember(topic, response, result)
+    return result
+
+
+def ask_stream(topic):
+    """Run `ask` as a stream of events for progressive rendering.
+
+    Yields {"event": "stage", "stage": ...} as the pipeline moves through
+    categorizing, researching and writing, then {"event": "token", "text": ...}
+    for each article chunk and finally {"event": "done", "result": ..., "timings": ...}.
+    A question answered from the question cache skips straight from a
+    "cached" stage to its whole article as one token.
+    """
+    with request_budget() as budget:
+        start = time.perf_counter()
+        timings = {}
+        cached = recall(topic)
+        if cached is not None:
+            yield {"event": "stage", "stage": "cached", "matched": cached["semantic_match"]["query"]}
+            yield {"event": "token", "text": cached["article"]}
+            timings["first_token_s"] = timings["total_s"] = round(time.perf_counter() - start, 3)
+            yield {"event": "done", "result": dict(cached, budget=budget.report()), "timings": timings}
+            return
+        yield {"event": "stage", "stage": "categorizing"}
+        response = categorize(topic)
+        categories = resolve_categories(response)
+        site = response.get("site")
+        timings["categorized_s"] = round(time.perf_counter() - start, 3)
+        yield {"event": "stage", "stage": "researching", "categories": categories, "site": site}
+        results = _research_all(topic, response, categories)
+        data = merge_research(results)
+        timings["researched_s"] = round(time.perf_counter() - start, 3)
+        yield {"event": "stage", "stage": "writing"}
+        chunks = []
+        for text in get_agent(WriterAgent).stream_article(data, ", ".join(categories), site):
+            if not chunks:
+                timings["first_token_s"] = round(time.perf_counter() - start, 3)
+            chunks.append(text)
+            yield {"event": "token", "text": text}
+        timings["total_s"] = round(time.perf_counter() - start, 3)
+    result = {
+        "topic": topic, "category": categories[0], "categories": categories,
+        "site": site, "site_id": response["site_id"], "research": data, "article": "".join(chunks),
+        "as_of": as_of(results), "budget": budget.report(),
+    }
+    remember(topic, response, result)
+    yield {"event": "done", "result": result, "timings": timings}
+
+
+async def aask_stream(topic):
+    """Async counterpart of `ask_stream`."""
+    with request_budget() as budget:
+        start = time.perf_counter()
+        timings = {}
+        cached = recall(topic)
+        if cached is not None:
+            yield {"event": "stage", "stage": "cached", "matched": cached["semantic_match"]["query"]}
+            yield {"event": "token", "text": cached["article"]}
+            timings["first_token_s"] = timings["total_s"] = round(time.perf_counter() - start, 3)
+            yield {"event": "done", "result": dict(cached, budget=budget.report()), "timings": timings}
+            return
+        yield {"event": "stage", "stage": "categorizing"}
+        response = await acategorize(topic)
+        categories = resolve_categories(response)
+        site = response.get("site")
+        timings["categorized_s"] = round(time.perf_counter() - start, 3)
+        yield {"event": "stage", "stage": "researching", "categories": categories, "site": site}
+        results = dict(zip(categories, await asyncio.gather(
+            *(aresearch_facet(topic, response, c) for c in categories)
+        )))
+        data = merge_research(results)
+        timings["researched_s"] = round(time.perf_counter() - start, 3)
+        yield {"event": "stage", "stage": "writing"}
+        chunks = []
+        async for text in get_agent(WriterAgent).astream_article(data, ", ".join(categories), site):
+            if not chunks:
+                timings["first_token_s"] = round(time.perf_counter() - start, 3)
+            chunks.append(text)
+            yield {"event": "token", "text": text}
+        timings["total_s"] = round(time.perf_counter() - start, 3)
+    result = {
+        "topic": topic, "category": categories[0], "categories": categories,
+        "site": site, "site_id": response["site_id"], "research": data, "article": "".join(chunks),
+        "as_of": as_of(results), "budget": budget.report(),
+    }
+    remember(topic, response, result)
+    yield {"event": "done", "result": result, "timings": timings}
+
+
+async def aask_many(topics, concurrency=32):
+    """Run many questions on one event loop with at most `concurrency` in flight.
+
+    Failures are returned in place of the result so one bad query does not
+    cancel the rest.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(topic):
+        async with semaphore:
+            return await aask(topic)
+
+    return await asyncio.gather(*(bounded(t) for t in topics), return_exceptions=True)
@@ -0,0 +1,285 @@
+"""Agent prompts compiled once into a static prefix and a per-call suffix.
+
+Each agent sends the same role, task list, output schema and rules on every
+call; only the query, site and research change. A SplitPrompt keeps that
+static part first and byte-identical across calls, and direct model calls
+send it as the system instruction, so the provider can cache it. The
+variable part comes last.
+
+With PROMPT_CACHE=gemini, each static prefix long enough to qualify is also
+stored as an explicit Gemini context cache (through the optional google-genai
+package) and calls reference it instead of resending it. A cache only serves
+the model it was created for, so the swap happens in the model that actually
+serves the call (see `caching`): with routing fallbacks, a call that falls
+back to another model uses that model's cache. Otherwise Gemini's implicit
+prefix caching still applies to the shared prefix.
+
+`prompt_usage` counts input, cached and output tokens per prompt.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import re
+import textwrap
+import threading
+import time
+from collections import Counter, defaultdict
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage, SystemMessage
+
+
+_log = logging.getLogger("heritage.prompts")
+_prompts = {}
+
+
+def compact(text):
+    """`text` without the source indentation and trailing blanks an inline prompt carries."""
+    first, _, rest = text.strip("\n").partition("\n")
+    text = first.strip() + "\n" + textwrap.dedent(rest)
+    text = "\n".join(line.rstrip() for line in text.splitlines())
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class SplitPrompt:
+    """A prompt as a static prefix and a `str.format` template for the rest.
+
+    The static part is used verbatim (its JSON braces need no escaping);
+    only `variable` is formatted, with the values passed to each call.
+    """
+
+    def __init__(self, name, static, variable):
+        self.name = name
+        self.static = compact(static)
+        self.variable = compact(variable)
+        self.static_tokens = estimate_tokens(self.static)
+        # Attached to each call so prompt_usage can attribute its tokens.
+        self.metadata = {"prompt": name}
+        _prompts[name] = self
+
+    def suffix(self, **values):
+        return self.variable.format(**values)
+
+    def render(self, **values):
+        """The whole prompt as one string, for ReAct agents that take a single input."""
+        return f"{self.static}\n\n{self.suffix(**values)}"
+
+    def inputs(self, extra="", **values):
+        """(messages, call options) for a direct model call.
+
+        The static part is the system instruction. With context caches on,
+        the prompt is also named in the options, so a `caching` model can
+        swap the instruction for its cache of it.
+        """
+        human = HumanMessage(self.suffix(**values) + extra)
+        options = {"config": {"metadata": self.metadata}}
+        if context_caches.enabled:
+            options["split_prompt"] = self.name
+        return [SystemMessage(self.static), human], options
+
+
+class ContextCaches:
+    """Explicit Gemini context caches of each prompt's static prefix.
+
+    Off unless PROMPT_CACHE=gemini. A cache is created on first use per
+    (prompt, model) and recreated shortly before its PROMPT_CACHE_TTL runs
+    out. Prefixes under PROMPT_CACHE_MIN_TOKENS are never cached (Gemini
+    rejects small caches), and a prompt whose cache cannot be created falls
+    back to sending its full prefix.
+
+    Creating a cache is a network call made outside the lock by one caller
+    per (prompt, model); others meanwhile keep using the cache being renewed
+    while it lasts, or send the full prefix.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("PROMPT_CACHE", "off") == "gemini"
+        self.ttl = int(os.getenv("PROMPT_CACHE_TTL", "3600"))
+        self.min_tokens = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+        self._lock = threading.Lock()
+        self._caches = {}
+        self._creating = set()
+        self._client = None
+        self._created = 0
+        self._failed = 0
+
+    def get(self, prompt, model):
+        """The cache name to send `prompt` against on `model`, or None."""
+        if not self.enabled or not model or prompt.static_tokens < self.min_tokens:
+            return None
+        key = (prompt.name, model)
+        with self._lock:
+            entry = self._caches.get(key, ())
+            if entry is None:
+                return None
+            now = time.time()
+            if entry and entry[1] - now >= 60:
+                return entry[0]
+            if key in self._creating:
+                return entry[0] if entry and entry[1] > now else None
+            self._creating.add(key)
+        entry = None
+        try:
+            entry = self._create(prompt, model)
+        finally:
+            with self._lock:
+                self._caches[key] = entry
+                self._creating.discard(key)
+        return entry[0] if entry else None
+
+    def _create(self, prompt, model):
+        try:
+            from google import genai
+            from google.genai import types
+        except ImportError:
+            _log.warning("PROMPT_CACHE=gemini needs the google-genai package; sending full prompts")
+            self.enabled = False
+            return None
+        try:
+            if self._client is None:
+                self._client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+            cache = self._client.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    display_name=f"heritage-{prompt.name}",
+                    system_instruction=prompt.static,
+                    ttl=f"{self.ttl}s",
+                ),
+            )
+        except Exception as exc:
+            with self._lock:
+                self._failed += 1
+            _log.warning(json.dumps({"prompt_cache_failed": prompt.name, "error": repr(exc)}))
+            return None
+        with self._lock:
+            self._created += 1
+        return cache.name, time.time() + self.ttl
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "caches": sum(1 for entry in self._caches.values() if entry),
+                "created": self._created,
+                "failed": self._failed,
+            }
+
+
+context_caches = ContextCaches()
+
+
+@functools.lru_cache(maxsize=None)
+def caching(model_cls):
+    """`model_cls` that sends a SplitPrompt's static part from its own context cache.
+
+    The prompt named in the `split_prompt` call option is looked up for
+    this model; if it has a cache, the leading system instruction is dropped
+    and the cache referenced instead.
+    """
+
+    class Caching(model_cls):
+        def _swap(self, messages, kwargs):
+            prompt = _prompts.get(kwargs.pop("split_prompt", None))
+            if prompt is None or not messages or messages[0].content != prompt.static:
+                return messages, kwargs
+            cached = context_caches.get(prompt, getattr(self, "model", None))
+            if not cached:
+                return messages, kwargs
+            return messages[1:], dict(kwargs, cached_content=cached)
+
+        async def _aswap(self, messages, kwargs):
+            # Creating or renewing a cache blocks on the network.
+            if "split_prompt" not in kwargs:
+                return messages, kwargs
+            return await asyncio.to_thread(self._swap, messages, kwargs)
+
+        def _generate(self, messages, *args, **kwargs):
+            messages, kwargs = self._swap(messages, kwargs)
+            return super()._generate(messages, *args, **kwargs)
+
+        async def _agenerate(self, messages, *args, **kwargs):
+            messages, kwargs = await self._aswap(messages, kwargs)
+            return await super()._agenerate(messages, *args, **kwargs)
+
+        def _stream(self, messages, *args, **kwargs):
+            messages, kwargs = self._swap(messages, kwargs)
+            return super()._stream(messages, *args, **kwargs)
+
+        async def _astream(self, messages, *args, **kwargs):
+            messages, kwargs = await self._aswap(messages, kwargs)
+            async for chunk in super()._astream(messages, *args, **kwargs):
+                yield chunk
+
+    Caching.__name__ = Caching.__qualname__ = model_cls.__name__
+    return Caching
+
+
+class PromptUsage(BaseCallbackHandler):
+    """Token usage per prompt, from the usage metadata of each model call.
+
+    Calls are matched to prompts by the "prompt" metadata SplitPrompt
+    attaches, which ReAct agents pass down to every step.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = {}
+        self._usage = defaultdict(Counter)
+
+    def _start(self, run_id, metadata):
+        name = (metadata or {}).get("prompt")
+        if name:
+            with self._lock:
+                self._runs[run_id] = name
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, metadata)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            name = self._runs.pop(run_id, None)
+        if name is None:
+            return
+        usage = Counter(calls=1)
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                usage["input_tokens"] += metadata.get("input_tokens", 0)
+                usage["output_tokens"] += metadata.get("output_tokens", 0)
+                usage["cached_tokens"] += (metadata.get("input_token_details") or {}).get("cache_read", 0)
+        with self._lock:
+            self._usage[name].update(usage)
+
+    def stats(self):
+        """Per prompt: calls, tokens and the estimated size of its static prefix."""
+        with self._lock:
+            usage = {name: dict(counts) for name, counts in self._usage.items()}
+        report = {}
+        for name, prompt in sorted(_prompts.items()):
+            counts = usage.get(name, {})
+            calls = counts.get("calls", 0)
+            report[name] = {
+                "static_tokens": prompt.static_tokens,
+                "calls": calls,
+                "input_tokens": counts.get("input_tokens", 0),
+                "cached_tokens": counts.get("cached_tokens", 0),
+                "output_tokens": counts.get("output_tokens", 0),
+                "input_tokens_per_call": round(counts.get("input_tokens", 0) / calls, 1) if calls else 0,
+            }
+        return report
+
+
+prompt_usage = PromptUsage()
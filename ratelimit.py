@@ -0,0 +1,341 @@
+"""Per-provider rate limits and retries shared by every thread and process on a host.
+
+Each provider (gemini, serpapi) has one token bucket in a SQLite file
+(RATE_LIMIT_PATH), refilled at <PROVIDER>_RPS requests per second with
+bursts of up to <PROVIDER>_BURST. A caller reserves the next free slot in
+one short transaction and sleeps until it comes, so waiters are served in
+order and never poll.
+
+Calls that fail with a rate-limit or overload error are retried up to
+RETRY_ATTEMPTS times. The wait is the provider's retry-after hint when it
+gives one, otherwise jittered exponential backoff, and the whole bucket is
+paused for it: every other caller on the host backs off too, instead of
+each one retrying on its own into the same limit.
+"""
+import asyncio
+import functools
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from langchain_core.rate_limiters import BaseRateLimiter
+
+
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "4"))
+BACKOFF_BASE = float(os.getenv("RETRY_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX = float(os.getenv("RETRY_BACKOFF_MAX", "30.0"))
+
+_RETRYABLE_CODES = {429, 503}
+_RETRYABLE_TEXT = re.compile(
+    r"\b(429|503|rate.?limit\w*|too many requests|resource.?exhausted|quota|throughput|overloaded|unavailable)\b",
+    re.IGNORECASE,
+)
+_RETRY_HINT = re.compile(r"retry\D{0,20}?(\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _count(provider, **amounts):
+    with _stats_lock:
+        _stats.setdefault(provider, Counter()).update(amounts)
+
+
+class SharedRateLimiter(BaseRateLimiter):
+    """A token bucket kept in SQLite so every process on the host draws from it.
+
+    A reservation may take the bucket below zero; the deficit is the queue,
+    and each caller waits for its own share of it.
+    """
+
+    def __init__(self, name, requests_per_second, burst=None, path=None):
+        self.name = name
+        self.rate = requests_per_second
+        self.burst = burst or max(1.0, requests_per_second)
+        self.path = path or os.getenv("RATE_LIMIT_PATH", "ratelimit.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS buckets (
+                   name TEXT PRIMARY KEY,
+                   tokens REAL NOT NULL,
+                   updated_at REAL NOT NULL
+               )"""
+        )
+
+    def _update(self, change):
+        """Apply `change(tokens) -> (tokens, result)` to the refilled bucket atomically."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at FROM buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                tokens, updated_at = row or (self.burst, now)
+                tokens = min(self.burst, tokens + max(0.0, now - updated_at) * self.rate)
+                tokens, result = change(tokens)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (self.name, tokens, now)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def _reserve(self, blocking):
+        """Seconds until the reserved slot, or None if not blocking and none is free now."""
+        def reserve(tokens):
+            if tokens >= 1:
+                return tokens - 1, 0.0
+            if not blocking:
+                return tokens, None
+            return tokens - 1, (1 - tokens) / self.rate
+        return self._update(reserve)
+
+    def pause(self, seconds):
+        """Hold every caller off for at least `seconds` from now.
+
+        Pauses overlap rather than add up: many callers hitting the same
+        limit at once hold the bucket until the latest deadline among them.
+        """
+        self._update(lambda tokens: (min(tokens, -seconds * self.rate), None))
+        _count(self.name, pauses=1)
+
+    def _record(self, wait):
+        with _stats_lock:
+            stats = _stats.setdefault(self.name, Counter())
+            stats["acquired"] += 1
+            stats["wait_seconds"] += wait
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], wait)
+
+    def acquire(self, *, blocking=True):
+        wait = self._reserve(blocking)
+        if wait is None:
+            return False
+        if wait > 0:
+            _count(self.name, waiting=1)
+            try:
+                time.sleep(wait)
+            finally:
+                _count(self.name, waiting=-1)
+        self._record(wait)
+        return True
+
+    async def aacquire(self, *, blocking=True):
+        # The reservation may wait on another process's SQLite lock.
+        wait = await asyncio.to_thread(self._reserve, blocking)
+        if wait is None:
+            return False
+        if wait > 0:
+            _count(self.name, waiting=1)
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                _count(self.name, waiting=-1)
+        self._record(wait)
+        return True
+
+
+@functools.lru_cache(maxsize=None)
+def limiter(provider):
+    """The shared bucket for `provider` under its <PROVIDER>_RPS cap, or None if unset."""
+    rps = float(os.getenv(f"{provider.upper()}_RPS", "0") or 0)
+    if rps <= 0:
+        return None
+    burst = float(os.getenv(f"{provider.upper()}_BURST", "0") or 0)
+    return SharedRateLimiter(provider, rps, burst or None)
+
+
+def set_rates(**rps):
+    """Set <PROVIDER>_RPS for each provider given a rate, e.g. from CLI flags.
+
+    Call before any client is built: `limiter` reads them once.
+    """
+    for provider, rate in rps.items():
+        if rate:
+            os.environ[f"{provider.upper()}_RPS"] = str(rate)
+
+
+def retry_after(exc):
+    """The provider's suggested wait in seconds for `exc`, if it gave one."""
+    hint = getattr(exc, "retry_after", None)
+    if hint is not None:
+        return float(hint)
+    for detail in getattr(exc, "details", None) or ():
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    if headers.get("Retry-After"):
+        try:
+            return float(headers["Retry-After"])
+        except ValueError:
+            pass
+    match = _RETRY_HINT.search(str(exc))
+    return float(match.group(1)) if match else None
+
+
+def retryable(exc):
+    """Whether `exc` is a rate limit or overload worth waiting out."""
+    code = getattr(exc, "code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if code in _RETRYABLE_CODES:
+        return True
+    return bool(_RETRYABLE_TEXT.search(str(exc)))
+
+
+def backoff(attempt, hint=None):
+    """Seconds to wait before retry number `attempt`.
+
+    A server hint is honoured with a little jitter on top, so the callers
+    it was given to do not all return at once; otherwise full jitter over
+    an exponentially growing window.
+    """
+    if hint is not None:
+        return min(BACKOFF_MAX, hint) * random.uniform(1.0, 1.2)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def _next_delay(provider, exc, attempt):
+    """The wait before the next attempt, or re-raise `exc` when it should not be retried."""
+    if not retryable(exc):
+        raise exc
+    if attempt >= RETRY_ATTEMPTS:
+        _count(provider, gave_up=1)
+        raise exc
+    _count(provider, retries=1)
+    return backoff(attempt, retry_after(exc))
+
+
+def _wait(provider, delay):
+    bucket = limiter(provider)
+    if bucket is None:
+        time.sleep(delay)
+        return
+    bucket.pause(delay)
+    bucket.acquire()
+
+
+async def _await(provider, delay):
+    bucket = limiter(provider)
+    if bucket is None:
+        await asyncio.sleep(delay)
+        return
+    await asyncio.to_thread(bucket.pause, delay)
+    await bucket.aacquire()
+
+
+def call(provider, fn):
+    """`fn()` retried on rate limits, each retry queued behind the provider's bucket."""
+    attempt = 1
+    while True:
+        try:
+            return fn()
+        except Exception as exc:
+            delay = _next_delay(provider, exc, attempt)
+        _wait(provider, delay)
+        attempt += 1
+
+
+def limited(provider, fn):
+    """`fn()` once its turn in `provider`'s bucket comes, retried like `call`."""
+    bucket = limiter(provider)
+    if bucket is not None:
+        bucket.acquire()
+    return call(provider, fn)
+
+
+async def acall(provider, fn):
+    attempt = 1
+    while True:
+        try:
+            return await fn()
+        except Exception as exc:
+            delay = _next_delay(provider, exc, attempt)
+        await _await(provider, delay)
+        attempt += 1
+
+
+def stream(provider, start):
+    """Yield from `start()`, retrying like `call` until the first chunk arrives."""
+    attempt = 1
+    while True:
+        started = False
+        try:
+            for chunk in start():
+                started = True
+                yield chunk
+            return
+        except Exception as exc:
+            if started:
+                raise
+            delay = _next_delay(provider, exc, attempt)
+        _wait(provider, delay)
+        attempt += 1
+
+
+async def astream(provider, start):
+    attempt = 1
+    while True:
+        started = False
+        try:
+            async for chunk in start():
+                started = True
+                yield chunk
+            return
+        except Exception as exc:
+            if started:
+                raise
+            delay = _next_delay(provider, exc, attempt)
+        await _await(provider, delay)
+        attempt += 1
+
+
+@functools.lru_cache(maxsize=None)
+def retrying(model_cls, provider="gemini"):
+    """`model_cls` with every model call retried through `provider`'s limiter.
+
+    The client's own retries should be turned off (max_retries=1), or each
+    of them hits the limit again without waiting its turn.
+    """
+
+    class Retrying(model_cls):
+        def _generate(self, *args, **kwargs):
+            return call(provider, lambda: super(Retrying, self)._generate(*args, **kwargs))
+
+        async def _agenerate(self, *args, **kwargs):
+            return await acall(provider, lambda: super(Retrying, self)._agenerate(*args, **kwargs))
+
+        def _stream(self, *args, **kwargs):
+            return stream(provider, lambda: super(Retrying, self)._stream(*args, **kwargs))
+
+        def _astream(self, *args, **kwargs):
+            return astream(provider, lambda: super(Retrying, self)._astream(*args, **kwargs))
+
+    Retrying.__name__ = Retrying.__qualname__ = model_cls.__name__
+    return Retrying
+
+
+def stats():
+    """Per provider: acquisitions, queue wait, callers waiting now, pauses and retries."""
+    with _stats_lock:
+        report = {}
+        for provider, counts in _stats.items():
+            acquired = counts["acquired"]
+            report[provider] = {
+                "acquired": acquired,
+                "waiting": counts["waiting"],
+                "avg_wait_ms": round(1000 * counts["wait_seconds"] / acquired, 2) if acquired else 0.0,
+                "max_wait_ms": round(1000 * counts["max_wait_seconds"], 2),
+                "wait_seconds_total": round(counts["wait_seconds"], 3),
+                "pauses": counts["pauses"],
+                "retries": counts["retries"],
+                "gave_up": counts["gave_up"],
+            }
+        return report
@@ -0,0 +1,187 @@
+"""Which Gemini models each agent runs on.
+
+Agents are routed to a tier by class name or category (MODEL_ROUTES, e.g.
+{"CategorizerAgent": "fast", "Tickets & Pricing": "strong"}); anything
+unrouted uses MODEL_DEFAULT_TIER. Each tier lists models to try in order
+and a request timeout (MODEL_TIERS, e.g. {"fast": {"models":
+["gemini-2.0-flash-lite", "gemini-2.0-flash"], "timeout": 20}}): a model
+that errors, times out or stays rate-limited after its retries falls back
+to the next one.
+
+Output that fails its schema can be retried one tier up (ESCALATION),
+unless MODEL_ESCALATION=off.
+
+`model_usage` reports calls, errors, fallbacks, escalations, latency,
+tokens and estimated cost per tier and per model, priced from
+MODEL_PRICES (USD per million input and output tokens).
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+DEFAULT_TIERS = {
+    "fast": {"models": ["gemini-2.0-flash-lite", "gemini-2.0-flash"], "timeout": 20},
+    "standard": {"models": ["gemini-2.0-flash", "gemini-2.0-flash-lite"], "timeout": 60},
+    "strong": {"models": ["gemini-2.5-flash", "gemini-2.0-flash"], "timeout": 120},
+}
+# Short structured answers go on the cheapest models; research and writing on
+# the default tier.
+DEFAULT_ROUTES = {
+    "CategorizerAgent": "fast",
+    "PlannerAgent": "fast",
+}
+ESCALATION = {"fast": "standard", "standard": "strong"}
+# USD per million (input, output) tokens.
+PRICES = {
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+
+def _env_json(name):
+    return json.loads(os.getenv(name, "") or "{}")
+
+
+class Router:
+    def __init__(self, tiers=None, routes=None, escalation=None, prices=None):
+        self.tiers = {name: dict(spec) for name, spec in DEFAULT_TIERS.items()}
+        for name, spec in dict(_env_json("MODEL_TIERS"), **(tiers or {})).items():
+            # A bare list of models is shorthand for {"models": [...]}.
+            spec = {"models": spec} if isinstance(spec, list) else spec
+            self.tiers[name] = dict(self.tiers.get(name, {}), **spec)
+        self.routes = dict(DEFAULT_ROUTES, **_env_json("MODEL_ROUTES"), **(routes or {}))
+        self.default_tier = os.getenv("MODEL_DEFAULT_TIER", "standard")
+        if escalation is None:
+            escalation = ESCALATION if os.getenv("MODEL_ESCALATION", "on") == "on" else {}
+        self.escalations = escalation
+        self.prices = dict(PRICES, **{model: tuple(p) for model, p in _env_json("MODEL_PRICES").items()})
+
+    def tier(self, name, category=None):
+        """The tier for an agent, by class name, then category, then the default."""
+        return self.routes.get(name) or self.routes.get(category) or self.default_tier
+
+    def models(self, tier):
+        return self.tiers[tier]["models"]
+
+    def timeout(self, tier):
+        return float(self.tiers[tier].get("timeout") or os.getenv("GEMINI_TIMEOUT", "60"))
+
+    def escalation(self, tier):
+        """The tier to retry on when `tier`'s output fails its schema, or None."""
+        return self.escalations.get(tier)
+
+    def cost(self, model, input_tokens, output_tokens):
+        input_price, output_price = self.prices.get(model, (0.0, 0.0))
+        return (input_tokens * input_price + output_tokens * output_price) / 1e6
+
+
+router = Router()
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ModelUsage(BaseCallbackHandler):
+    """Latency, tokens and cost of every model call, by tier and by model.
+
+    Calls are attributed by the "tier" and "model" metadata each routed
+    client carries. A call to any model but its tier's first counts as a
+    fallback.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = {}
+        self._tiers = defaultdict(Counter)
+        self._models = defaultdict(Counter)
+        self._latencies = defaultdict(lambda: deque(maxlen=1000))
+
+    def _start(self, run_id, metadata):
+        metadata = metadata or {}
+        if "tier" in metadata:
+            with self._lock:
+                self._runs[run_id] = (metadata["tier"], metadata["model"], time.perf_counter())
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, metadata)
+
+    def _finish(self, run_id, **amounts):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if run is None:
+                return
+            tier, model, start = run
+            seconds = time.perf_counter() - start
+            amounts = Counter(amounts, calls=1, seconds=seconds)
+            if tier in router.tiers and model != router.models(tier)[0]:
+                amounts["fallbacks"] += 1
+            self._tiers[tier].update(amounts)
+            self._models[model].update(amounts)
+            self._latencies[tier].append(seconds)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, errors=1)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.get(run_id)
+        if run is None:
+            return
+        usage = Counter()
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                usage["input_tokens"] += metadata.get("input_tokens", 0)
+                usage["output_tokens"] += metadata.get("output_tokens", 0)
+        cost = router.cost(run[1], usage["input_tokens"], usage["output_tokens"])
+        self._finish(run_id, cost_usd=cost, **usage)
+
+    def escalated(self, tier):
+        """Count an answer from `tier` that failed its schema and was retried a tier up."""
+        with self._lock:
+            self._tiers[tier]["escalations"] += 1
+
+    @staticmethod
+    def _report(counts):
+        calls = counts["calls"]
+        return {
+            "calls": calls,
+            "errors": counts["errors"],
+            "fallbacks": counts["fallbacks"],
+            "avg_latency_s": round(counts["seconds"] / calls, 3) if calls else 0.0,
+            "input_tokens": counts["input_tokens"],
+            "output_tokens": counts["output_tokens"],
+            "cost_usd": round(counts["cost_usd"], 6),
+            "cost_per_call_usd": round(counts["cost_usd"] / calls, 6) if calls else 0.0,
+        }
+
+    def stats(self):
+        with self._lock:
+            tiers = {}
+            for tier, counts in sorted(self._tiers.items()):
+                latencies = self._latencies[tier]
+                tiers[tier] = dict(
+                    self._report(counts),
+                    escalations=counts["escalations"],
+                    p50_latency_s=round(_percentile(latencies, 0.5), 3),
+                    p95_latency_s=round(_percentile(latencies, 0.95), 3),
+                )
+            models = {model: self._report(counts) for model, counts in sorted(self._models.items())}
+        return {"tiers": tiers, "models": models}
+
+
+model_usage = ModelUsage()
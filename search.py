@@ -0,0 +1,110 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from langchain_community.utilities import SerpAPIWrapper
+
+import ratelimit
+from metrics import note
+
+
+def normalize_query(query):
+    """Collapse trivially different search strings onto one cache key.
+
+    Case, punctuation and spacing are ignored, so "Louvre opening hours?"
+    and "louvre  opening hours" share an entry. Word order is kept:
+    "Paris to Versailles" and "Versailles to Paris" are different searches.
+    """
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+
+class SearchClient:
+    """One SerpAPI client for the whole process with a TTL/LRU result cache.
+
+    Concurrent calls for the same normalized query wait on the first one
+    instead of issuing their own request. With a `provider`, real requests
+    queue for that provider's shared rate limit and are retried through it.
+    """
+
+    def __init__(self, ttl=None, max_entries=None, backend=None, provider=None):
+        self.ttl = ttl or float(os.getenv("SEARCH_CACHE_TTL", str(6 * 3600)))
+        self.max_entries = max_entries or int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2000"))
+        self._backend = backend
+        self.provider = provider
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._merged = 0
+
+    def _client(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = SerpAPIWrapper()
+        return self._backend
+
+    def run(self, query, charge=None):
+        """Search results for `query`.
+
+        `charge()` is called before a request is actually sent, and may
+        raise to refuse it; cache hits and waits on an identical request
+        already in flight are not charged.
+        """
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self._cache.move_to_end(key)
+                self._hits += 1
+                note("search_cache")
+                return entry[1]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                if charge is not None:
+                    charge()
+                future = Future()
+                self._inflight[key] = future
+                self._misses += 1
+            else:
+                self._merged += 1
+        if not leader:
+            note("search_in_flight")
+            return future.result()
+
+        try:
+            # Only real requests wait for the rate limit; cache hits stay free.
+            if self.provider is None:
+                result = self._client().run(query)
+            else:
+                result = ratelimit.limited(self.provider, lambda: self._client().run(query))
+        except BaseException as exc:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            self._cache[key] = (time.time() + self.ttl, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            del self._inflight[key]
+        future.set_result(result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            total = self._hits + self._misses + self._merged
+            return {
+                "entries": len(self._cache),
+                "hits": self._hits,
+                "misses": self._misses,
+                "merged_in_flight": self._merged,
+                "hit_rate": round((self._hits + self._merged) / total, 3) if total else 0.0,
+            }
@@ -0,0 +1,304 @@
+"""Cache of finished answers, found again by question similarity.
+
+"Entry fee for the Acropolis" and "how much are Acropolis tickets?" get the
+same article: the writer only sees the research for the question's
+categories and site, not its wording. Each question is embedded locally
+(hashed word and character n-grams plus the classifier's category cues, with
+the site name masked out) and matched against earlier questions about the
+same site and categories. A close enough match returns the stored answer
+before any model call is made.
+"""
+import atexit
+import calendar
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import CATEGORY_TTLS, DEFAULT_TTL
+from classifier import KEYWORD_RULES, IntentClassifier
+from sites import site_key
+
+
+DIMENSIONS = 1 << 18
+# Category cues and other named places outweigh any single word: they decide
+# what the answer is about.
+CUE_WEIGHT = 3.0
+NAME_WEIGHT = 3.0
+NGRAM_WEIGHT = 0.25
+
+# Minimum cosine similarity for a hit, by the matched answer's main category.
+# Comparisons and custom experiences hinge on details a paraphrase can change.
+DEFAULT_THRESHOLD = 0.6
+THRESHOLDS = {
+    "Comparison & Recommendations": 0.8,
+    "Custom Experience": 0.7,
+}
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "at", "in", "on", "to", "is", "are", "was",
+    "do", "does", "i", "me", "my", "we", "you", "it", "its", "this", "that",
+    "be", "can", "please", "about",
+}
+_CUES = {category: re.compile(rule, re.IGNORECASE) for category, rule in KEYWORD_RULES.items()}
+_NAME = re.compile(r"\b[A-Z][\w'’]+")
+
+_log = logging.getLogger("heritage.semantic")
+
+
+def embed(text):
+    """Sparse unit vector ({dimension: weight}) of `text`'s hashed features."""
+    features = Counter()
+    words = [word for word in re.findall(r"[a-z']+", text.lower()) if word not in _STOPWORDS]
+    for word in words:
+        features["w:" + word] += 1
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            features["g:" + padded[i:i + 3]] += NGRAM_WEIGHT
+    for first, second in zip(words, words[1:]):
+        features[f"b:{first} {second}"] += 1
+    for category, cue in _CUES.items():
+        if cue.search(text):
+            features["c:" + category] += CUE_WEIGHT
+    # Capitalised words other than the first: the other site in "Hampi or Badami".
+    for name in _NAME.findall(text)[1:]:
+        features["n:" + name.lower()] += NAME_WEIGHT
+    vector = defaultdict(float)
+    for feature, weight in features.items():
+        digest = zlib.crc32(feature.encode("utf-8"))
+        vector[digest % DIMENSIONS] += -weight if digest >> 31 else weight
+    norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+    return {dimension: w / norm for dimension, w in vector.items()}
+
+
+def similarity(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(dimension, 0.0) for dimension, w in a.items())
+
+
+class Entry:
+    def __init__(self, query, site_id, categories, result, created_at, expires_at):
+        self.query = query
+        self.site_id = site_id
+        self.categories = categories
+        self.result = result
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.bucket = None
+        self.vector = None
+
+    def to_dict(self):
+        return {
+            "query": self.query, "site_id": self.site_id, "categories": self.categories,
+            "result": self.result, "created_at": self.created_at, "expires_at": self.expires_at,
+        }
+
+
+class QuestionCache:
+    """Nearest-neighbour cache of pipeline results keyed by question.
+
+    The index is in memory, partitioned by (site id, predicted categories),
+    so a lookup only scores the few earlier questions that could share an
+    answer. It is written to a JSON snapshot at most every
+    SEMANTIC_CACHE_SNAPSHOT_S seconds, on a background thread so callers on
+    an event loop never wait for the disk, and on exit; it is reloaded on
+    start.
+    Entries expire along with the research they were written from.
+
+    A sample of hits (SEMANTIC_CACHE_AUDIT_RATE) is re-checked in the
+    background with `verify(query) -> (site_id, categories)`, normally the
+    model categorizer; a hit whose question the model files differently
+    counts as a false hit.
+    """
+
+    def __init__(self, path=None, thresholds=None, max_entries=None, verify=None, audit_rate=None):
+        self.path = path or os.getenv("SEMANTIC_CACHE_PATH", "semantic_cache.json")
+        self.thresholds = dict(THRESHOLDS, **json.loads(os.getenv("SEMANTIC_THRESHOLDS", "") or "{}"))
+        self.thresholds.update(thresholds or {})
+        self.default_threshold = float(os.getenv("SEMANTIC_THRESHOLD", DEFAULT_THRESHOLD))
+        self.max_entries = max_entries or int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+        self.snapshot_interval = float(os.getenv("SEMANTIC_CACHE_SNAPSHOT_S", "30"))
+        self.verify = verify
+        if audit_rate is None:
+            audit_rate = float(os.getenv("SEMANTIC_CACHE_AUDIT_RATE", "0.05"))
+        self.audit_rate = audit_rate
+        self.classifier = IntentClassifier()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._buckets = defaultdict(list)
+        self._hits = 0
+        self._misses = 0
+        self._seconds = 0.0
+        self._audited = 0
+        self._false_hits = 0
+        self._audits = deque(maxlen=50)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._auditor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="semantic-audit")
+        self._saver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="semantic-snapshot")
+        self.load()
+        atexit.register(self.save)
+
+    def _probe(self, query):
+        """(bucket key, vector) for `query`, or (None, None) when no site is named."""
+        result, _ = self.classifier.predict(query)
+        key = site_key(result["site"])
+        if not key:
+            return None, None
+        masked = query.replace(result["site"], " ")
+        return (key, tuple(sorted(result["categories"]))), embed(masked)
+
+    def threshold(self, category):
+        return self.thresholds.get(category, self.default_threshold)
+
+    def get(self, query):
+        """(stored result, matched question, similarity) for a near-duplicate of `query`, or None."""
+        start = time.perf_counter()
+        bucket, vector = self._probe(query)
+        best, best_score = None, 0.0
+        now = time.time()
+        with self._lock:
+            for entry in list(self._buckets.get(bucket, ())):
+                if entry.expires_at <= now:
+                    self._drop(entry)
+                    continue
+                score = similarity(vector, entry.vector)
+                if score >= self.threshold(entry.categories[0]) and score > best_score:
+                    best, best_score = entry, score
+            if best is not None:
+                self._entries.move_to_end(id(best))
+                self._hits += 1
+            else:
+                self._misses += 1
+            self._seconds += time.perf_counter() - start
+        if best is None:
+            return None
+        if self.verify is not None and random.random() < self.audit_rate:
+            self._auditor.submit(self._audit, query, best, best_score)
+        return best.result, best.query, round(best_score, 3)
+
+    def put(self, query, result):
+        """Store a finished pipeline result for `query`.
+
+        It expires when the oldest research it was written from does, so an
+        answer built on stale research is not stored at all.
+        """
+        bucket, vector = self._probe(query)
+        if bucket is None:
+            return
+        categories = result["categories"]
+        now = time.time()
+        ttl = min(CATEGORY_TTLS.get(category, DEFAULT_TTL) for category in categories)
+        researched = [
+            calendar.timegm(time.strptime(when, "%Y-%m-%dT%H:%M:%SZ"))
+            for when in (result.get("as_of") or {}).values()
+        ]
+        expires_at = min(researched, default=now) + ttl
+        if expires_at <= now:
+            return
+        entry = Entry(query, bucket[0], categories, result, now, expires_at)
+        entry.vector = vector
+        with self._lock:
+            self._add(bucket, entry)
+            self._dirty = True
+            due = time.monotonic() - self._saved_at >= self.snapshot_interval
+            if due:
+                # Claimed here so puts until the write finishes do not queue more.
+                self._saved_at = time.monotonic()
+        if due:
+            self._saver.submit(self.save)
+
+    def _add(self, bucket, entry):
+        entry.bucket = bucket
+        self._entries[id(entry)] = entry
+        self._buckets[bucket].append(entry)
+        while len(self._entries) > self.max_entries:
+            _, oldest = self._entries.popitem(last=False)
+            self._buckets[oldest.bucket].remove(oldest)
+
+    def _drop(self, entry):
+        self._entries.pop(id(entry), None)
+        self._buckets[entry.bucket].remove(entry)
+        self._dirty = True
+
+    def _audit(self, query, entry, score):
+        try:
+            site_id, categories = self.verify(query)
+        except Exception as exc:
+            _log.warning(json.dumps({"semantic_audit_failed": query, "error": repr(exc)}))
+            return
+        false_hit = site_id != entry.site_id or sorted(categories) != sorted(entry.categories)
+        record = {
+            "query": query, "matched": entry.query, "similarity": round(score, 3),
+            "false_hit": false_hit,
+        }
+        with self._lock:
+            self._audited += 1
+            self._false_hits += false_hit
+            self._audits.append(record)
+        if false_hit:
+            _log.warning(json.dumps({"semantic_false_hit": record}))
+
+    def audits(self):
+        """The most recent audited hits, newest last."""
+        with self._lock:
+            return list(self._audits)
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            _log.warning(f"ignoring unreadable semantic cache snapshot {self.path}")
+            return
+        now = time.time()
+        with self._lock:
+            for item in saved:
+                if item["expires_at"] <= now:
+                    continue
+                bucket, vector = self._probe(item["query"])
+                if bucket is None:
+                    continue
+                entry = Entry(**item)
+                entry.vector = vector
+                self._add(bucket, entry)
+
+    def save(self):
+        """Write the snapshot if anything changed since the last one."""
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = [entry.to_dict() for entry in self._entries.values()]
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        # The exit hook may run while a background write is still going.
+        with self._save_lock:
+            temp = f"{self.path}.tmp"
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(temp, self.path)
+
+    def stats(self):
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 3) if total else 0.0,
+                "avg_lookup_ms": round(1000 * self._seconds / total, 3) if total else 0.0,
+                "audited": self._audited,
+                "false_hits": self._false_hits,
+                "false_hit_rate": round(self._false_hits / self._audited, 3) if self._audited else 0.0,
+            }
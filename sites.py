@@ -0,0 +1,268 @@
+import functools
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+
+
+_LEADING_ARTICLE = re.compile(r"^(the|la|le|el|il)\s+")
+
+# Well-known sites and the short or local names people use for them. More can
+# be loaded from SITE_NAMES_PATH: one site per line, aliases after tabs.
+KNOWN_SITES = {
+    "taj mahal": ["taj", "tajmahal", "taj mahal agra"],
+    "machu picchu": ["machu pichu", "machupicchu"],
+    "angkor wat": ["angkor", "angkor vat"],
+    "colosseum": ["colosseo", "coliseum", "roman colosseum", "flavian amphitheatre"],
+    "acropolis": ["acropolis of athens", "parthenon"],
+    "pyramids of giza": ["giza pyramids", "great pyramid of giza", "great pyramid", "giza"],
+    "great wall of china": ["great wall", "the great wall"],
+    "louvre": ["louvre museum", "musee du louvre"],
+    "eiffel tower": ["tour eiffel"],
+    "golden temple": ["harmandir sahib", "sri harmandir sahib", "darbar sahib"],
+    "red fort": ["lal qila", "lal quila"],
+    "hampi": ["group of monuments at hampi", "vijayanagara"],
+    "petra": ["rose city"],
+    "stonehenge": [],
+    "chichen itza": ["chichen itza pyramid", "el castillo"],
+    "forbidden city": ["palace museum", "gugong"],
+    "alhambra": ["alhambra palace"],
+    "sagrada familia": ["basilica de la sagrada familia"],
+    "qutub minar": ["qutb minar", "qutab minar"],
+    "hagia sophia": ["ayasofya", "aya sofya"],
+}
+
+# Minimum trigram (Dice) similarity for a fuzzy match; names shorter than
+# MIN_FUZZY_LENGTH only ever match exactly.
+FUZZY_THRESHOLD = 0.7
+MIN_FUZZY_LENGTH = 4
+# A candidate must also be within typo distance: this many edits (insert,
+# delete, substitute or swap adjacent letters), two for names of
+# LONG_NAME_LENGTH or more. An extra word such as "museum" or "zoo" costs
+# more than that, so "Acropolis Museum" stays apart from "acropolis".
+MAX_EDITS = 1
+LONG_NAME_LENGTH = 9
+# Posting entries a fuzzy lookup may count before it stops reading lists.
+SCAN_LIMIT = 3000
+# Names resolved by fuzzy match or seen for the first time, remembered in
+# memory only.
+RECENT_LIMIT = 10000
+
+
+def normalize_site(site):
+    """Canonical cache key for a free-form site name, or '' if no site was given.
+
+    "The Taj Mahal, Agra" and "taj mahal" both become "taj mahal".
+    """
+    if not site or site.strip().lower() == "unknown":
+        return ""
+    text = unicodedata.normalize("NFKD", site)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    # Drop a trailing ", City" / "(Country)" qualifier.
+    text = re.split(r"[,(]", text, maxsplit=1)[0]
+    text = re.sub(r"[^\w\s]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return _LEADING_ARTICLE.sub("", text)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Edits (with adjacent swaps) turning `a` into `b`, or `limit + 1` once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def max_edits(name):
+    return MAX_EDITS + (len(name) >= LONG_NAME_LENGTH)
+
+
+class SiteIndex:
+    """Resolves free-form site names to stable canonical site ids.
+
+    Exact aliases are a dict lookup. Anything else is matched against every
+    known name by trigram similarity through an inverted index. Only the
+    query's rarest trigrams are read and only names that can still reach
+    the threshold are scored, which keeps lookups around a millisecond or
+    less with hundreds of thousands of names. A candidate is only accepted
+    within typo distance (see MAX_EDITS): similar names of different sites,
+    such as "Angkor Thom" and "Angkor Wat", do not merge.
+
+    Aliases added with `alias` are persisted to SQLite. Fuzzy hits and
+    names that match nothing (which are their own id) are only remembered
+    in a bounded in-memory table, so a misspelling never becomes a
+    permanent alias and the index does not grow with every name asked.
+    """
+
+    def __init__(self, path=None, names_path=None, threshold=FUZZY_THRESHOLD):
+        self.path = path or os.getenv("SITE_INDEX_PATH", "sites.sqlite3")
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._aliases = {}
+        self._names = []
+        self._grams = []
+        self._postings = defaultdict(list)
+        self._recent = OrderedDict()
+        self._exact = 0
+        self._fuzzy = 0
+        self._new = 0
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS site_aliases (
+                   alias TEXT PRIMARY KEY,
+                   site_id TEXT NOT NULL
+               )"""
+        )
+        for canonical, aliases in KNOWN_SITES.items():
+            self._add(canonical, canonical)
+            for alias in aliases:
+                self._add(alias, canonical)
+        names_path = names_path or os.getenv("SITE_NAMES_PATH")
+        if names_path:
+            self.load(names_path)
+        for alias, site_id in self._conn.execute("SELECT alias, site_id FROM site_aliases"):
+            self._add(alias, site_id)
+
+    def _add(self, alias, site_id):
+        if alias in self._aliases:
+            return
+        self._aliases[alias] = site_id
+        grams = trigrams(alias)
+        position = len(self._names)
+        self._names.append(alias)
+        self._grams.append(grams)
+        for gram in grams:
+            self._postings[gram].append(position)
+
+    def load(self, path):
+        """Add sites from a file of `canonical<TAB>alias<TAB>...` lines."""
+        with open(path, encoding="utf-8") as f, self._lock:
+            for line in f:
+                names = [normalize_site(name) for name in line.rstrip("\n").split("\t")]
+                names = [name for name in names if name]
+                for name in names:
+                    self._add(name, names[0])
+
+    def _fuzzy_match(self, key):
+        grams = trigrams(key)
+        # A name with Dice similarity >= t shares at least t*|q|/(2-t) of the
+        # query's trigrams. Count shared trigrams from the rarest posting lists
+        # up; once the scan budget is spent, names that cannot reach `needed`
+        # even with every unscanned trigram are dropped unscored.
+        needed = math.ceil(self.threshold * len(grams) / (2 - self.threshold))
+        rarest = sorted(grams, key=lambda gram: len(self._postings.get(gram, ())))
+        counts = Counter()
+        scanned = scanned_entries = 0
+        for gram in rarest:
+            postings = self._postings.get(gram, ())
+            if scanned > len(grams) - needed and scanned_entries + len(postings) > SCAN_LIMIT:
+                break
+            counts.update(postings)
+            scanned += 1
+            scanned_entries += len(postings)
+        floor = needed - (len(grams) - scanned)
+        limit = max_edits(key)
+        best, best_rank = None, None
+        for position in [position for position, count in counts.items() if count >= floor]:
+            other = self._grams[position]
+            score = 2 * len(grams & other) / (len(grams) + len(other))
+            if score < self.threshold:
+                continue
+            edits = edit_distance(key, self._names[position], limit)
+            if edits <= limit and (best_rank is None or (edits, -score) < best_rank):
+                best, best_rank = position, (edits, -score)
+        return None if best is None else self._aliases[self._names[best]]
+
+    def _resolve(self, key):
+        """(site id, how it was found) for a normalised name; call with the lock held."""
+        site_id = self._aliases.get(key)
+        if site_id is not None:
+            return site_id, "exact"
+        site_id = self._recent.get(key)
+        if site_id is not None:
+            self._recent.move_to_end(key)
+            return site_id, "recent"
+        site_id = self._fuzzy_match(key) if len(key) >= MIN_FUZZY_LENGTH else None
+        how = "new" if site_id is None else "fuzzy"
+        site_id = site_id or key
+        self._recent[key] = site_id
+        while len(self._recent) > RECENT_LIMIT:
+            self._recent.popitem(last=False)
+        return site_id, how
+
+    def resolve(self, site):
+        """Stable id for `site` ('' when no site was given)."""
+        key = normalize_site(site)
+        if not key:
+            return ""
+        with self._lock:
+            site_id, how = self._resolve(key)
+            if how == "exact":
+                self._exact += 1
+            elif how == "fuzzy":
+                self._fuzzy += 1
+            elif how == "new":
+                self._new += 1
+            return site_id
+
+    def knows(self, site):
+        """Whether `site` names a site already in the index, exactly or within typo distance."""
+        key = normalize_site(site)
+        if not key:
+            return False
+        with self._lock:
+            site_id, _ = self._resolve(key)
+            return key in self._aliases or site_id != key
+
+    def alias(self, name, site):
+        """Record `name` as another name for the site `site` resolves to."""
+        site_id = self.resolve(site)
+        key = normalize_site(name)
+        if not key or not site_id:
+            return
+        with self._lock:
+            if key not in self._aliases:
+                self._recent.pop(key, None)
+                self._add(key, site_id)
+                self._conn.execute("INSERT OR IGNORE INTO site_aliases VALUES (?, ?)", (key, site_id))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "names": len(self._names),
+                "recent": len(self._recent),
+                "sites": len(set(self._aliases.values())),
+                "exact": self._exact,
+                "fuzzy": self._fuzzy,
+                "new": self._new,
+            }
+
+
+@functools.lru_cache(maxsize=None)
+def get_site_index():
+    return SiteIndex()
+
+
+def site_key(site):
+    """The process-wide stable id for a free-form site name; use it to key caches."""
+    return get_site_index().resolve(site)
@@ -0,0 +1,38 @@
+import pytest
+
+from classifier import IntentClassifier, site_candidates
+from sites import SiteIndex
+
+
+@pytest.fixture
+def classifier(tmp_path):
+    return IntentClassifier(sites=SiteIndex(path=str(tmp_path / "sites.sqlite3")))
+
+
+@pytest.mark.parametrize("query, site", [
+    ("From Delhi, how do I reach the Taj Mahal?", "Taj Mahal"),
+    ("In August, is the Colosseum crowded?", "Colosseum"),
+    ("What does UNESCO say about Angkor Wat?", "Angkor Wat"),
+    ("Is the Taj Mahal closed on Fridays?", "Taj Mahal"),
+    ("Which is better to visit—Hampi or Badami?", "Hampi"),
+])
+def test_known_sites_win_over_other_capitalised_words(classifier, query, site):
+    result = classifier.classify(query)
+    assert result is not None
+    assert result["site"] == site
+
+
+@pytest.mark.parametrize("query", [
+    "Should I visit Machu Picchu or Chichen Itza?",
+    "From Delhi, how far is Xyzabad Fort from Jaipur?",
+])
+def test_more_than_one_candidate_goes_to_the_llm(classifier, query):
+    assert classifier.classify(query) is None
+
+
+def test_leading_prepositions_months_and_weekdays_are_not_sites():
+    assert site_candidates("In August, on Mondays, is Xyzabad Fort busy?") == ["Xyzabad Fort"]
+
+
+def test_the_tail_of_a_capitalised_run_can_be_the_known_site():
+    assert site_candidates("Visit Hampi please", lambda name: name.lower() == "hampi") == ["Hampi"]
@@ -0,0 +1,31 @@
+import pytest
+
+import sites
+from facts import FactStore
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setenv("SITE_INDEX_PATH", str(tmp_path / "sites.sqlite3"))
+    sites.get_site_index.cache_clear()
+    yield sites.get_site_index()
+    sites.get_site_index.cache_clear()
+
+
+@pytest.fixture
+def store(tmp_path, index):
+    return FactStore(path=str(tmp_path / "facts.sqlite3"))
+
+
+@pytest.mark.parametrize("reported", ["site", "Badami", "Hampi Bazaar"])
+def test_the_site_name_in_an_answer_is_not_made_an_alias(index, store, reported):
+    store.record("General Information", "Hampi", {"site": reported, "established_year": "1336"})
+    assert index.resolve(reported) != "hampi"
+    assert index.stats()["names"] == sites.SiteIndex(path=index.path).stats()["names"]
+
+
+def test_recorded_facts_are_keyed_on_the_site_id(store):
+    store.record("General Information", "Hampi", {"site": "Hampi", "established_year": "1336"})
+    known, missing, _ = store.lookup("General Information", "Group of Monuments at Hampi")
+    assert known["established_year"] == "1336"
+    assert "founded_by" in missing
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from parsing import OutputParser, ParseError, _repair, conform, extract_json
+
+
+def test_extract_json_takes_the_first_object_out_of_prose():
+    text = 'Thought: done.\nFinal Answer: {"site": "Petra", "note": "a } in a string"} and {"other": 1}'
+    assert extract_json(text) == ({"site": "Petra", "note": "a } in a string"}, False)
+
+
+def test_extract_json_repairs_when_strict_parsing_fails():
+    assert extract_json("```json\n{'site': 'Petra', 'open': True,}\n```") == ({"site": "Petra", "open": True}, True)
+
+
+@pytest.mark.parametrize("text", ["", "no object here", "[1, 2]"])
+def test_extract_json_raises_parse_error_without_an_object(text):
+    with pytest.raises(ParseError):
+        extract_json(text)
+
+
+def test_extract_json_closes_a_truncated_object():
+    assert extract_json('{"site": "Petra", "hours": [1, 2') == ({"site": "Petra", "hours": [1, 2]}, True)
+
+
+@pytest.mark.parametrize("broken, fixed", [
+    ("{“site”: “Petra”}", {"site": "Petra"}),
+    ("{'site': 'Petra'}", {"site": "Petra"}),
+    ('{"open": True, "closed": False, "fee": None}', {"open": True, "closed": False, "fee": None}),
+    ('{"days": ["mon", "tue",], }', {"days": ["mon", "tue"]}),
+    ('{"site": "Petra", "timing": {"days": ["mon"', {"site": "Petra", "timing": {"days": ["mon"]}}),
+    ('{"site": "Pet', {"site": "Pet"}),
+])
+def test_repair(broken, fixed):
+    assert json.loads(_repair(broken)) == fixed
+
+
+def test_conform_fills_missing_fields_and_keeps_extras():
+    schema = {"site": str, "location": {"country": str, "city": str}, "modes": [str]}
+    value = {"site": "Petra", "location": {"country": "Jordan"}, "extra": 1}
+    assert conform(value, schema) == {
+        "site": "Petra",
+        "location": {"country": "Jordan", "city": None},
+        "modes": [],
+        "extra": 1,
+    }
+
+
+def test_conform_coerces_leaves():
+    schema = {"open": bool, "night": bool, "odd": bool, "fee": str, "year": str, "days": [str], "note": str}
+    value = {"open": "Yes", "night": "no", "odd": "maybe", "fee": "N/A", "year": 1632, "days": "mon", "note": {"a": 1}}
+    assert conform(value, schema) == {
+        "open": True, "night": False, "odd": None, "fee": None, "year": "1632", "days": ["mon"], "note": '{"a": 1}',
+    }
+
+
+def test_conform_replaces_a_non_object_with_an_empty_shape():
+    assert conform("closed", {"timing": {"open": str}}) == {"timing": {"open": None}}
+
+
+def test_parse_rejects_an_object_with_only_the_site_in_common():
+    parser = OutputParser()
+    result = parser.parse("TicketsAgent", "Tickets & Pricing", '{"site": "Taj Mahal", "location": {"country": "India"}}')
+    assert not result.ok
+    assert parser.stats()["TicketsAgent"]["failed"] == 1
+
+
+def test_parse_accepts_an_object_with_a_category_key():
+    result = OutputParser().parse("TicketsAgent", "Tickets & Pricing", '{"site": "Taj Mahal", "ticketing": {"currency": "INR"}}')
+    assert result.ok
+    assert result.data["ticketing"]["currency"] == "INR"
+    assert result.data["ticketing"]["pricing"]["local_adult"] is None
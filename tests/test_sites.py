@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+
+from sites import SiteIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SiteIndex(path=str(tmp_path / "sites.sqlite3"))
+
+
+@pytest.mark.parametrize("name, other", [
+    ("Angkor Thom", "angkor wat"),
+    ("Great Pyramid of Cholula", "pyramids of giza"),
+    ("Golden Temple of Dambulla", "golden temple"),
+    ("Giza Zoo", "pyramids of giza"),
+    ("Acropolis Museum", "acropolis"),
+])
+def test_similar_names_of_different_sites_stay_apart(index, name, other):
+    assert index.resolve(name) != other
+
+
+@pytest.mark.parametrize("name, site_id", [
+    ("Taj Mahl", "taj mahal"),
+    ("Machu Picchuu", "machu picchu"),
+    ("Colloseum", "colosseum"),
+    ("Eifel Tower", "eiffel tower"),
+    ("Sagrada Famila", "sagrada familia"),
+])
+def test_typos_resolve_to_the_known_site(index, name, site_id):
+    assert index.resolve(name) == site_id
+
+
+def test_fuzzy_hits_and_new_names_are_not_persisted(index):
+    index.resolve("Taj Mahl")
+    index.resolve("Some Unlisted Fort")
+    assert _persisted(index.path) == []
+    reopened = SiteIndex(path=index.path)
+    assert "taj mahl" not in reopened._aliases
+    assert reopened.resolve("Taj Mahl") == "taj mahal"
+
+
+def test_explicit_aliases_are_persisted(index):
+    index.alias("Taj Mahal Mausoleum", "Taj Mahal")
+    assert _persisted(index.path) == [("taj mahal mausoleum", "taj mahal")]
+    assert SiteIndex(path=index.path).resolve("Taj Mahal Mausoleum") == "taj mahal"
+
+
+def _persisted(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT alias, site_id FROM site_aliases").fetchall()
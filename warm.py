@@ -0,0 +1,179 @@
+"""Pre-answer common questions about the most-asked sites off-peak.
+
+    python warm.py --sites top_sites.txt --top 50 --concurrency 4 --max-tokens 2000000
+    python warm.py --log answers.jsonl --top 20 --off-peak 1-6
+
+Sites come from a file (one per line, most popular first), from query logs
+(JSONL with "site" or "query" per line, such as batch.py output; sites are
+ranked by how often they were asked about), or else from sites.KNOWN_SITES.
+For each site, one typical question per category is run through the normal
+pipeline, so the same agents fill the research cache, the fact store and the
+question cache that peak traffic then hits. Questions already in the
+question cache cost nothing; research still fresh only costs the writer.
+
+Run it from cron, e.g. `0 2 * * * python warm.py --log answers.jsonl`.
+--off-peak makes it exit without work outside the given hours, and stops
+scheduling new questions once the window closes.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from agents import SPECIALISTS
+from classifier import extract_site
+from pipeline import aask
+from ratelimit import set_rates
+from sites import KNOWN_SITES, get_site_index, site_key
+
+
+# One typical question per category; the question cache matches rewordings.
+WARM_QUESTIONS = {
+    "General Information": "Tell me about the {site}.",
+    "Location & Accessibility": "Where is the {site} located?",
+    "Visiting Hours & Timing": "What are the opening hours of the {site}?",
+    "Tickets & Pricing": "How much is the entry fee for the {site}?",
+    "Historical & Cultural Insights": "Who built the {site} and why?",
+    "Visitor Tips & Rules": "What should I wear when visiting the {site}?",
+    "Facilities & Nearby Attractions": "What can I see near the {site}?",
+    "Custom Experience": "Can I get a private tour of the {site}?",
+    "Comparison & Recommendations": "What other sites are similar to the {site}?",
+    "Language & Culture": "What language is spoken at the {site}?",
+}
+
+
+def sites_from_file(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def sites_from_log(path):
+    """Sites in a JSONL query log, most asked first, each under its most common spelling."""
+    asked = Counter()
+    spellings = defaultdict(Counter)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, str):
+                record = {"query": record}
+            site = record.get("site") or extract_site(record.get("query") or "", get_site_index().knows)
+            key = site_key(site)
+            if key:
+                asked[key] += 1
+                spellings[key][site] += 1
+    return [spellings[key].most_common(1)[0][0] for key, _ in asked.most_common()]
+
+
+def in_window(window, now=None):
+    """Whether the hour of `now` falls in an "H-H" window; windows may wrap midnight."""
+    start, end = (int(hour) for hour in window.split("-"))
+    hour = (now or datetime.now()).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+class Warmer:
+    """Runs warm-up questions under a concurrency limit and a total token/search quota.
+
+    Usage is read from each result's request budget report. Once either
+    quota is spent, or the off-peak window closes, no new question starts;
+    those already running finish.
+    """
+
+    def __init__(self, concurrency, max_tokens=None, max_searches=None, window=None):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_tokens = max_tokens
+        self.max_searches = max_searches
+        self.window = window
+        self.used = Counter()
+        self.warmed = 0
+        self.already = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def stop_reason(self):
+        if self.max_tokens is not None and self.used["tokens"] >= self.max_tokens:
+            return "token quota spent"
+        if self.max_searches is not None and self.used["searches"] >= self.max_searches:
+            return "search quota spent"
+        if self.window and not in_window(self.window):
+            return "off-peak window closed"
+        return None
+
+    async def _warm(self, question):
+        async with self.semaphore:
+            if self.stop_reason():
+                self.skipped += 1
+                return
+            try:
+                result = await aask(question)
+            except Exception as exc:
+                self.failed += 1
+                print(f"failed: {question}: {exc!r}", file=sys.stderr)
+                return
+        if "semantic_match" in result:
+            self.already += 1
+            return
+        self.warmed += 1
+        usage = result["budget"]["usage"]
+        self.used.update(tokens=usage.get("tokens", 0), searches=usage.get("searches", 0))
+
+    async def run(self, questions):
+        await asyncio.gather(*(self._warm(question) for question in questions))
+
+
+def questions_for(sites, categories):
+    # Site by site, so the most popular sites are warm first if the quota runs out.
+    return [WARM_QUESTIONS[category].format(site=site) for site in sites for category in categories]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--sites", help="file of site names, most popular first")
+    source.add_argument("--log", help="JSONL query log to rank sites from")
+    parser.add_argument("--top", type=int, default=20, help="number of sites to warm")
+    parser.add_argument("--categories", nargs="+", choices=sorted(SPECIALISTS), help="default: all")
+    parser.add_argument("--concurrency", type=int, default=4, help="questions in flight")
+    parser.add_argument("--max-tokens", type=int, help="stop after this many model tokens")
+    parser.add_argument("--max-searches", type=int, help="stop after this many web searches")
+    parser.add_argument("--off-peak", metavar="H-H", help="only run between these hours, e.g. 1-6")
+    parser.add_argument("--llm-rps", type=float, help="Gemini requests per second")
+    parser.add_argument("--search-rps", type=float, help="SerpAPI requests per second")
+    args = parser.parse_args()
+
+    if args.off_peak and not in_window(args.off_peak):
+        print(f"outside the off-peak window {args.off_peak}; nothing to do", file=sys.stderr)
+        return
+    set_rates(gemini=args.llm_rps, serpapi=args.search_rps)
+
+    if args.sites:
+        sites = sites_from_file(args.sites)
+    elif args.log:
+        sites = sites_from_log(args.log)
+    else:
+        sites = [name.title() for name in KNOWN_SITES]
+    sites = sites[:args.top]
+    questions = questions_for(sites, args.categories or list(WARM_QUESTIONS))
+    print(f"warming {len(questions)} questions for {len(sites)} sites", file=sys.stderr)
+
+    start = time.perf_counter()
+    warmer = Warmer(args.concurrency, args.max_tokens, args.max_searches, args.off_peak)
+    asyncio.run(warmer.run(questions))
+    print(
+        f"{warmer.warmed} warmed, {warmer.already} already cached, {warmer.failed} failed, "
+        f"{warmer.skipped} skipped ({warmer.stop_reason() or 'done'}); "
+        f"{warmer.used['tokens']} tokens, {warmer.used['searches']} searches "
+        f"in {time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+    sys.exit(1 if warmer.failed else 0)
+
+
+if __name__ == "__main__":
+    main()